@@ -1,10 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from flask_bcrypt import Bcrypt
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.utils import secure_filename
 import os
 from dotenv import load_dotenv
-from db_connection import get_db_connection as get_conn
+from db_connection import get_db_connection, get_request_connection as get_conn, init_app as init_db, pool_stats, read_replica
+from query_log import init_app as init_query_log
+import event_summary
+from cache import make_cache, LocalCache, PrefixCache
+from markupsafe import Markup
+from search_index import SearchIndex
+from seatmap import SeatMapRegistry
+from waiting_room import WaitingRoom
+from cart_store import CartStore, build_cart
+from passwords import PasswordHasher, PasswordsBusy
+from rate_limit import RateLimiter, make_buckets, budget
+import purchase_history
+import lookups
+import search_backends
+import ticket_claims
 from functools import wraps
 import secrets
 from datetime import datetime, timedelta
@@ -18,7 +31,23 @@ app.config['UPLOAD_FOLDER'] = os.path.join(app.static_folder, 'img')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
-bcrypt = Bcrypt(app)
+init_db(app)  # one pooled connection per request, released on teardown
+init_query_log(app)  # per-request SQL timings, slow-query and N+1 log
+
+# bcrypt runs on its own small thread pool with a bounded queue. The cost is
+# calibrated to PASSWORD_HASH_TARGET_MS at startup unless BCRYPT_LOG_ROUNDS pins it.
+passwords = PasswordHasher(rounds=int(os.getenv('BCRYPT_LOG_ROUNDS', '0')) or None,
+                           target_ms=int(os.getenv('PASSWORD_HASH_TARGET_MS', '250')),
+                           workers=int(os.getenv('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2)))),
+                           max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', '32')))
+PASSWORDS_BUSY_MESSAGE = "We are handling a lot of sign-ins right now. Please try again in a moment."
+
+# Per-client budgets for the expensive routes as 'tokens per second:burst'
+rate_limiter = RateLimiter(make_buckets())
+SEARCH_RATE = budget(os.getenv('RATE_LIMIT_SEARCH', '5:30'))
+LOGIN_RATE = budget(os.getenv('RATE_LIMIT_LOGIN', '0.1:10'))
+REGISTER_RATE = budget(os.getenv('RATE_LIMIT_REGISTER', '0.02:5'))
+FORGOT_PASSWORD_RATE = budget(os.getenv('RATE_LIMIT_FORGOT_PASSWORD', '0.02:5'))
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
@@ -34,21 +63,44 @@ class User(UserMixin):
         self.person_id = person_id
         self.is_admin = is_admin
 
+# Active users by id, so authenticated requests skip the users lookup.
+# Entries are dropped when a password or profile changes; changes made by
+# other workers without a shared CACHE_URL show up within USER_CACHE_TTL.
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '300'))
+user_cache = make_cache(maxsize=10000, default_ttl=USER_CACHE_TTL, prefix='tm:user:')
+
+def forget_user(user_id):
+    user_cache.delete(str(user_id))
+
+def remember_user(user_data):
+    # The cache only saves queries; if it is down, requests go to MySQL
+    try:
+        user_cache.set(str(user_data[0]), tuple(user_data))
+    except Exception as e:
+        print(f"User cache error: {e}")
+
 @login_manager.user_loader
 def load_user(user_id):
     try:
-        with get_conn() as conn, conn.cursor() as cur:
-            cur.execute("""
-                SELECT user_id, username, person_id, is_admin 
-                FROM users 
-                WHERE user_id = %s AND is_active = 1
-            """, (user_id,))
-            user_data = cur.fetchone()
-            if user_data:
-                return User(user_data[0], user_data[1], user_data[2], user_data[3])
-    except:
-        pass
-    return None
+        user_data = user_cache.get(str(user_id))
+    except Exception as e:
+        print(f"User cache error: {e}")
+        user_data = None
+    if user_data is None:
+        try:
+            with get_conn() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT user_id, username, person_id, is_admin 
+                    FROM users 
+                    WHERE user_id = %s AND is_active = 1
+                """, (user_id,))
+                user_data = cur.fetchone()
+        except:
+            pass
+        if not user_data:
+            return None
+        remember_user(user_data)
+    return User(user_data[0], user_data[1], user_data[2], user_data[3])
 
 # Admin required decorator
 def admin_required(f):
@@ -65,35 +117,132 @@ def admin_required(f):
 
 # ============== HOME & MAIN PAGES ==============
 
+# Rendered home-page fragments are identical for every visitor, so they are
+# cached and dropped whenever events, tickets or purchases are written.
+fragment_cache = make_cache(maxsize=64, default_ttl=int(os.getenv('HOME_CACHE_TTL', '60')))
+HOME_FRAGMENTS_KEY = 'home:fragments'
+
+def drop_home_fragments():
+    # Runs after committed writes, which a cache outage must not turn into errors
+    try:
+        fragment_cache.delete(HOME_FRAGMENTS_KEY)
+    except Exception as e:
+        print(f"Home cache error: {e}")
+
+# In-memory typeahead index, built on first search and rebuilt every
+# SEARCH_INDEX_MAX_AGE seconds to pick up writes made by other workers
+event_search = SearchIndex(max_age=int(os.getenv('SEARCH_INDEX_MAX_AGE', '300')))
+
+# 'index' (in-memory, default), 'fulltext' (MySQL FULLTEXT) or 'like' (original LIKE scan)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'index')
+SEARCH_FULLTEXT_MODE = os.getenv('SEARCH_FULLTEXT_MODE', 'boolean')
+
+# Typeahead results by query, narrowed in memory as the user keeps typing
+SEARCH_CANDIDATES = 200
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '30'))
+typeahead_cache = PrefixCache(maxsize=2048, ttl=SEARCH_CACHE_TTL)
+price_cache = LocalCache(maxsize=4096, default_ttl=SEARCH_CACHE_TTL)
+_NO_PRICE = object()
+
+# Per-event seat availability, updated in place on sales by this process
+seat_maps = SeatMapRegistry(max_age=int(os.getenv('SEATMAP_MAX_AGE', '30')))
+
+# Most tickets one basket may hold, picked by hand or best available
+MAX_BEST_AVAILABLE = 10
+
+# Idempotency keys of completed checkouts -> buyer, so replays skip the database
+completed_purchases = LocalCache(maxsize=10000, default_ttl=3600)
+
+# Selected tickets stay reserved for the buyer this long; expired holds are swept back
+HOLD_SECONDS = int(os.getenv('TICKET_HOLD_SECONDS', '600'))
+HOLD_SWEEP_INTERVAL = int(os.getenv('TICKET_HOLD_SWEEP_INTERVAL', '15'))
+
+# Carts live server-side until shortly after their holds expire
+carts = CartStore(make_cache(maxsize=10000, default_ttl=HOLD_SECONDS, prefix='tm:cart:'),
+                  ttl=HOLD_SECONDS + 300)
+
+def holds_released(released):
+    for ticket_id, event_id in released:
+        seat_maps.set_available(event_id, [ticket_id], True)
+
+# Admission control for on-sales: shoppers per event per second (per worker); 0 disables
+waiting_room = WaitingRoom(rate=float(os.getenv('WAITING_ROOM_RATE', '10')),
+                           burst=int(os.getenv('WAITING_ROOM_BURST', '50')),
+                           pass_ttl=int(os.getenv('WAITING_ROOM_PASS_SECONDS', '900')),
+                           claim_ttl=int(os.getenv('WAITING_ROOM_CLAIM_SECONDS', '60')))
+
+# Sharded availability counters are folded into event_summary this often
+COUNTER_COMPACT_INTERVAL = int(os.getenv('EVENT_COUNTER_COMPACT_INTERVAL', '60'))
+
+hold_sweeper = ticket_claims.HoldSweeper(get_db_connection, interval=HOLD_SWEEP_INTERVAL,
+                                         on_release=holds_released)
+if HOLD_SWEEP_INTERVAL > 0:
+    hold_sweeper.start()
+
+counter_compactor = event_summary.CounterCompactor(get_db_connection, interval=COUNTER_COMPACT_INTERVAL)
+if COUNTER_COMPACT_INTERVAL > 0:
+    counter_compactor.start()
+
+def catalog_changed(event_id=None, venue_id=None):
+    """Drop what an admin write to events, venues or ticket prices made stale."""
+    drop_home_fragments()
+    typeahead_cache.clear()
+    price_cache.clear()
+    if event_id is None and venue_id is None:
+        return
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            if event_id is not None:
+                event_search.refresh_event(cur, event_id)
+            if venue_id is not None:
+                event_search.refresh_venue(cur, venue_id)
+    except Exception as e:
+        print(f"Error refreshing search index: {e}")
+
 @app.route("/")
+@read_replica
 def home():
+    try:
+        fragments = fragment_cache.get(HOME_FRAGMENTS_KEY)
+    except Exception as e:
+        print(f"Home cache error: {e}")
+        fragments = None
+    if fragments is None:
+        fragments = render_home_fragments()
+    
+    return render_template("index.html", 
+                         featured_html=Markup(fragments['featured']),
+                         upcoming_html=Markup(fragments['upcoming']))
+
+def render_home_fragments():
     try:
         with get_conn() as conn, conn.cursor() as cur:
-            # Get upcoming events with concert details
+            # Get upcoming events from the pre-aggregated summary
             cur.execute("""
                 SELECT 
-                    e.event_id,
-                    e.title,
-                    e.start_time,
-                    e.e_description,
-                    v.v_name,
-                    v.city,
-                    ce.genre,
-                    MIN(t.face_value) as min_price,
-                    COUNT(DISTINCT CASE WHEN t.ticket_status = 'available' THEN t.ticket_id END) as available_tickets,
-                    e.image_path
-                FROM events e
-                JOIN venues v ON e.venue_id = v.venue_id
-                LEFT JOIN concert_events ce ON e.event_id = ce.event_id
-                LEFT JOIN tickets t ON e.event_id = t.event_id
-                WHERE e.start_time > NOW() AND e.e_status = 'scheduled'
-                GROUP BY e.event_id
-                ORDER BY e.start_time ASC
+                    event_id,
+                    title,
+                    start_time,
+                    e_description,
+                    venue_name,
+                    city,
+                    genre,
+                    min_price,
+                    available_count + (
+                        SELECT COALESCE(SUM(c.available_count), 0)
+                        FROM event_counter_shards c
+                        WHERE c.event_id = es.event_id
+                    ) AS available_count,
+                    image_path
+                FROM event_summary es
+                WHERE e_status = 'scheduled' AND start_time > NOW()
+                ORDER BY start_time ASC
                 LIMIT 12
             """)
             upcoming_events = cur.fetchall()
             
-            # Get featured event (The Weeknd specifically, or fallback to next big event)
+            # Featured slot: highest-priority featured event inside its schedule
+            # window, resolved from idx_events_featured
             cur.execute("""
                 SELECT 
                     e.event_id,
@@ -107,91 +256,114 @@ def home():
                 FROM events e
                 JOIN venues v ON e.venue_id = v.venue_id
                 LEFT JOIN concert_events ce ON e.event_id = ce.event_id
-                WHERE e.start_time > NOW() AND e.e_status = 'scheduled'
-                AND (e.title LIKE '%Weeknd%' OR e.title LIKE '%weeknd%')
-                ORDER BY e.start_time ASC
+                WHERE e.is_featured = 1 AND e.e_status = 'scheduled'
+                    AND e.start_time > NOW()
+                    AND (e.featured_from IS NULL OR e.featured_from <= NOW())
+                    AND (e.featured_until IS NULL OR e.featured_until > NOW())
+                ORDER BY e.featured_priority DESC, e.start_time ASC
                 LIMIT 1
             """)
             featured_event = cur.fetchone()
             
-            # If no Weeknd event found, fallback to next upcoming event
-            if not featured_event:
-                cur.execute("""
-                    SELECT 
-                        e.event_id,
-                        e.title,
-                        e.start_time,
-                        e.e_description,
-                        v.v_name,
-                        v.city,
-                        ce.genre,
-                        e.image_path
-                    FROM events e
-                    JOIN venues v ON e.venue_id = v.venue_id
-                    LEFT JOIN concert_events ce ON e.event_id = ce.event_id
-                    WHERE e.start_time > NOW() AND e.e_status = 'scheduled'
-                    ORDER BY e.start_time ASC
-                    LIMIT 1
-                """)
-                featured_event = cur.fetchone()
+            # Nothing featured right now: use the next upcoming event we already have
+            if not featured_event and upcoming_events:
+                first = upcoming_events[0]
+                featured_event = (first[0], first[1], first[2], first[3], first[4], first[5], first[6], first[9])
             
     except Exception as e:
         print(f"Error loading home page: {e}")
-        upcoming_events = []
-        featured_event = None
+        # Render the empty state but don't cache it
+        return {
+            'featured': render_template("index_featured.html", featured_event=None),
+            'upcoming': render_template("index_upcoming.html", upcoming_events=[]),
+        }
     
-    return render_template("index.html", 
-                         upcoming_events=upcoming_events,
-                         featured_event=featured_event)
+    fragments = {
+        'featured': render_template("index_featured.html", featured_event=featured_event),
+        'upcoming': render_template("index_upcoming.html", upcoming_events=upcoming_events),
+    }
+    try:
+        fragment_cache.set(HOME_FRAGMENTS_KEY, fragments)
+    except Exception as e:
+        print(f"Home cache error: {e}")
+    return fragments
 
 @app.route("/search")
+@rate_limiter.limit('search', *SEARCH_RATE)
+@read_replica
 def search():
     query = request.args.get('q', '').strip()
     if len(query) < 2:
         return jsonify([])
     
     try:
-        with get_conn() as conn, conn.cursor() as cur:
-            cur.execute("""
-                SELECT 
-                    e.event_id,
-                    e.title,
-                    e.start_time,
-                    v.v_name,
-                    v.city,
-                    ce.genre,
-                    MIN(t.face_value) as min_price
-                FROM events e
-                JOIN venues v ON e.venue_id = v.venue_id
-                LEFT JOIN concert_events ce ON e.event_id = ce.event_id
-                LEFT JOIN tickets t ON e.event_id = t.event_id
-                WHERE (e.title LIKE %s OR v.v_name LIKE %s OR ce.genre LIKE %s)
-                    AND e.start_time > NOW()
-                    AND e.e_status = 'scheduled'
-                GROUP BY e.event_id
-                ORDER BY e.start_time ASC
-                LIMIT 10
-            """, (f'%{query}%', f'%{query}%', f'%{query}%'))
-            results = cur.fetchall()
-            
-            search_results = []
-            for row in results:
-                search_results.append({
-                    'event_id': row[0],
-                    'title': row[1],
-                    'date': row[2].strftime('%b %d, %Y') if row[2] else '',
-                    'venue': f"{row[3]}, {row[4]}" if row[3] and row[4] else '',
-                    'genre': row[5] or '',
-                    'price': f"€{row[6]:.0f}" if row[6] else 'TBA'
-                })
-            
-            return jsonify(search_results)
+        search_results = []
+        for row in search_rows(query, limit=10):
+            search_results.append({
+                'event_id': row[0],
+                'title': row[1],
+                'date': row[2].strftime('%b %d, %Y') if row[2] else '',
+                'venue': f"{row[3]}, {row[4]}" if row[3] and row[4] else '',
+                'genre': row[5] or '',
+                'price': f"€{row[6]:.0f}" if row[6] else 'TBA'
+            })
+        
+        return jsonify(search_results)
     except Exception as e:
         print(f"Search error: {e}")
         return jsonify([])
 
+def search_rows(query, limit):
+    """(event_id, title, start_time, venue, city, genre, min_price) rows from SEARCH_BACKEND."""
+    key = query.lower()
+    candidates = typeahead_cache.get(key)
+    if candidates is None:
+        candidates, narrowable = search_candidates(query)
+        typeahead_cache.put(key, candidates, complete=narrowable and len(candidates) < SEARCH_CANDIDATES)
+    rows = [row for row, _ in candidates[:limit]]
+    if SEARCH_BACKEND not in ('fulltext', 'like'):
+        rows = with_prices(rows)
+    return rows
+
+def search_candidates(query):
+    """(row, haystack) pairs for a query and whether they may be narrowed for longer ones."""
+    if SEARCH_BACKEND == 'fulltext':
+        # Word-based relevance ranking can't be narrowed, only repeated
+        with get_conn() as conn, conn.cursor() as cur:
+            rows = search_backends.fulltext_search(cur, query, SEARCH_CANDIDATES, SEARCH_FULLTEXT_MODE)
+        return [(row, ()) for row in rows], False
+    if SEARCH_BACKEND == 'like':
+        with get_conn() as conn, conn.cursor() as cur:
+            rows = search_backends.like_search(cur, query, SEARCH_CANDIDATES)
+        return [(row, tuple(f.lower() for f in (row[1], row[3], row[5]) if f)) for row in rows], True
+    
+    event_search.load_if_stale(get_conn)
+    hits = event_search.search(query, limit=SEARCH_CANDIDATES)
+    return [((hit['event_id'], hit['title'], hit['start_time'], hit['venue'], hit['city'],
+              hit['genre'], None), tuple(hit['fields'])) for hit in hits], True
+
+def with_prices(rows):
+    """Fill in min_price for index hits, asking MySQL only for prices not cached yet."""
+    prices = {row[0]: price_cache.get(row[0], _NO_PRICE) for row in rows}
+    missing = [event_id for event_id, price in prices.items() if price is _NO_PRICE]
+    if missing:
+        with get_conn() as conn, conn.cursor() as cur:
+            placeholders = ','.join(['%s'] * len(missing))
+            cur.execute(f"""
+                SELECT event_id, min_price FROM event_summary WHERE event_id IN ({placeholders})
+            """, missing)
+            found = dict(cur.fetchall())
+        for event_id in missing:
+            prices[event_id] = found.get(event_id)
+            price_cache.set(event_id, prices[event_id])
+    return [row[:6] + (prices[row[0]],) for row in rows]
+
 @app.route("/event/<int:event_id>")
+@read_replica
 def event_details(event_id):
+    # During an on-sale every visitor waits in line before any query runs
+    if not waiting_room.enter(event_id):
+        return waiting_page(event_id)
     try:
         with get_conn() as conn, conn.cursor() as cur:
             # Get event details
@@ -221,29 +393,8 @@ def event_details(event_id):
                 flash('Event not found.', 'error')
                 return redirect(url_for('home'))
             
-            # Get available tickets
-            cur.execute("""
-                SELECT 
-                    t.ticket_id,
-                    t.face_value,
-                    t.currency,
-                    s.seat_section,
-                    s.row_label,
-                    s.seat_number,
-                    CASE WHEN vt.ticket_id IS NOT NULL THEN 'VIP' ELSE 'Regular' END as ticket_type,
-                    vt.vip_level,
-                    vt.perks
-                FROM tickets t
-                LEFT JOIN seats s ON t.seat_id = s.seat_id
-                LEFT JOIN vip_tickets vt ON t.ticket_id = vt.ticket_id
-                WHERE t.event_id = %s 
-                    AND t.ticket_status = 'available'
-                    AND NOT EXISTS (
-                        SELECT 1 FROM purchase_items pi WHERE pi.ticket_id = t.ticket_id
-                    )
-                ORDER BY t.face_value ASC
-            """, (event_id,))
-            tickets = cur.fetchall()
+            # Seats themselves are fetched lazily from event_seatmap
+            available_count = event_summary.available(cur, event_id)
             
             # Get performers
             cur.execute("""
@@ -267,10 +418,52 @@ def event_details(event_id):
     
     return render_template("event_details.html", 
                          event=event,
-                         tickets=tickets,
+                         available_count=available_count,
                          performers=performers)
 
+@app.route("/event/<int:event_id>/seatmap")
+@read_replica
+def event_seatmap(event_id):
+    if not waiting_room.enter(event_id):
+        return jsonify({'error': 'In line', 'queue': url_for('event_queue', event_id=event_id)}), 429
+    try:
+        seat_map = seat_maps.get(get_conn, event_id)
+    except Exception as e:
+        print(f"Error loading seat map: {e}")
+        return jsonify({'error': 'Seat map unavailable'}), 503
+    
+    response = jsonify(seat_map.to_json())
+    # Private: a shared cache would hand it to visitors without a pass
+    response.headers['Cache-Control'] = 'private, max-age=5'
+    return response
+
+def waiting_page(event_id):
+    """Join the line and show the waiting page; needs neither the database nor current_user."""
+    waiting_room.join(event_id)
+    return render_template("waiting_room.html", event_id=event_id, status=waiting_room.status(event_id))
+
+@app.route("/event/<int:event_id>/queue")
+def event_queue(event_id):
+    if waiting_room.enter(event_id):
+        return redirect(url_for('event_details', event_id=event_id))
+    return waiting_page(event_id)
+
+# Polled by waiting clients: reads only the session and process memory.
+# No login_required, because loading current_user would query the database;
+# callers without a queue token are told to rejoin through event_queue.
+@app.route("/event/<int:event_id>/queue/status")
+def event_queue_status(event_id):
+    status = waiting_room.status(event_id)
+    if status is None:
+        status = {'admitted': False, 'queued': False, 'rejoin': url_for('event_queue', event_id=event_id)}
+    elif status['admitted']:
+        status['next'] = url_for('event_details', event_id=event_id)
+    response = jsonify(status)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.route("/genres")
+@read_replica
 def genres():
     try:
         with get_conn() as conn, conn.cursor() as cur:
@@ -295,6 +488,7 @@ def genres():
     return render_template("genres.html", genres=genres_list)
 
 @app.route("/genre/<path:genre_name>")
+@read_replica
 def genre_events(genre_name):
     from urllib.parse import unquote
     # Decode the URL-encoded genre name
@@ -304,23 +498,19 @@ def genre_events(genre_name):
         with get_conn() as conn, conn.cursor() as cur:
             cur.execute("""
                 SELECT 
-                    e.event_id,
-                    e.title,
-                    e.start_time,
-                    v.v_name,
-                    v.city,
-                    ce.genre,
-                    MIN(t.face_value) as min_price,
-                    e.image_path
-                FROM events e
-                JOIN concert_events ce ON e.event_id = ce.event_id
-                JOIN venues v ON e.venue_id = v.venue_id
-                LEFT JOIN tickets t ON e.event_id = t.event_id
-                WHERE ce.genre = %s
-                    AND e.start_time > NOW()
-                    AND e.e_status = 'scheduled'
-                GROUP BY e.event_id
-                ORDER BY e.start_time ASC
+                    event_id,
+                    title,
+                    start_time,
+                    venue_name,
+                    city,
+                    genre,
+                    min_price,
+                    image_path
+                FROM event_summary
+                WHERE genre = %s
+                    AND e_status = 'scheduled'
+                    AND start_time > NOW()
+                ORDER BY start_time ASC
             """, (genre_name,))
             events = cur.fetchall()
             
@@ -335,6 +525,7 @@ def genre_events(genre_name):
 # ============== AUTHENTICATION ==============
 
 @app.route("/login", methods=["GET", "POST"])
+@rate_limiter.limit('login', *LOGIN_RATE, methods=('POST',))
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('home'))
@@ -357,14 +548,25 @@ def login():
                 user_data = cur.fetchone()
                 
                 if user_data and user_data[5]:  # is_active
-                    if bcrypt.check_password_hash(user_data[2], password):
+                    if passwords.verify(password, user_data[2]):
                         user = User(user_data[0], user_data[1], user_data[3], user_data[4])
                         login_user(user)
+                        # Fresh from the login query, so the next request needs no lookup
+                        remember_user((user_data[0], user_data[1], user_data[3], user_data[4]))
                         
                         # Update last login
                         cur.execute("""
                             UPDATE users SET last_login = NOW() WHERE user_id = %s
                         """, (user_data[0],))
+                        # Move the stored hash to the current cost while we have the
+                        # password; under load it simply waits for a later login
+                        if passwords.needs_rehash(user_data[2]):
+                            try:
+                                cur.execute("""
+                                    UPDATE users SET password_hash = %s WHERE user_id = %s
+                                """, (passwords.hash(password), user_data[0]))
+                            except PasswordsBusy:
+                                pass
                         conn.commit()
                         
                         flash(f"Welcome back, {username}!", "success")
@@ -372,6 +574,8 @@ def login():
                         return redirect(next_page if next_page else url_for('home'))
                 
                 flash("Invalid username or password.", "error")
+        except PasswordsBusy:
+            flash(PASSWORDS_BUSY_MESSAGE, "error")
         except Exception as e:
             print(f"Login error: {e}")
             flash("An error occurred during login. Please try again.", "error")
@@ -379,6 +583,7 @@ def login():
     return render_template("login.html")
 
 @app.route("/register", methods=["GET", "POST"])
+@rate_limiter.limit('register', *REGISTER_RATE, methods=('POST',))
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('home'))
@@ -433,7 +638,7 @@ def register():
                 """, (person_id,))
                 
                 # Create user record
-                password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+                password_hash = passwords.hash(password)
                 cur.execute("""
                     INSERT INTO users (person_id, username, password_hash, is_admin)
                     VALUES (%s, %s, %s, 0)
@@ -443,6 +648,8 @@ def register():
                 flash("Registration successful! Please log in.", "success")
                 return redirect(url_for('login'))
                 
+        except PasswordsBusy:
+            flash(PASSWORDS_BUSY_MESSAGE, "error")
         except Exception as e:
             print(f"Registration error: {e}")
             flash("An error occurred during registration. Please try again.", "error")
@@ -452,11 +659,13 @@ def register():
 @app.route("/logout")
 @login_required
 def logout():
+    forget_user(current_user.id)
     logout_user()
     flash("You have been logged out.", "success")
     return redirect(url_for('home'))
 
 @app.route("/forgot-password", methods=["GET", "POST"])
+@rate_limiter.limit('forgot-password', *FORGOT_PASSWORD_RATE, methods=('POST',))
 def forgot_password():
     if current_user.is_authenticated:
         return redirect(url_for('home'))
@@ -536,17 +745,21 @@ def reset_password(token):
                     return render_template("reset_password.html", token=token)
                 
                 # Update password
-                password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+                password_hash = passwords.hash(password)
                 cur.execute("""
                     UPDATE users 
                     SET password_hash = %s, reset_token = NULL, reset_token_expiry = NULL
                     WHERE user_id = %s
                 """, (password_hash, user_data[0]))
                 conn.commit()
+                forget_user(user_data[0])
                 
                 flash("Password reset successful! Please log in.", "success")
                 return redirect(url_for('login'))
                 
+    except PasswordsBusy:
+        flash(PASSWORDS_BUSY_MESSAGE, "error")
+        return render_template("reset_password.html", token=token)
     except Exception as e:
         print(f"Reset password error: {e}")
         flash("An error occurred. Please try again.", "error")
@@ -572,34 +785,70 @@ def profile():
             """, (current_user.id,))
             user_info = cur.fetchone()
             
-            # Get purchase history
-            cur.execute("""
-                SELECT 
-                    pur.purchase_id,
-                    pur.purchase_time,
-                    pur.total_amount,
-                    pur.purch_status,
-                    e.title,
-                    e.start_time,
-                    v.v_name,
-                    COUNT(pi.ticket_id) as ticket_count
-                FROM purchases pur
-                JOIN purchase_items pi ON pur.purchase_id = pi.purchase_id
-                JOIN tickets t ON pi.ticket_id = t.ticket_id
-                JOIN events e ON t.event_id = e.event_id
-                JOIN venues v ON e.venue_id = v.venue_id
-                WHERE pur.customer_id = %s
-                GROUP BY pur.purchase_id
-                ORDER BY pur.purchase_time DESC
-            """, (current_user.person_id,))
-            purchases = cur.fetchall()
+            # Newest purchases; older pages are fetched from profile_purchases
+            purchases, next_cursor = purchase_history.history_page(cur, current_user.person_id)
+            summary = profile_summary(cur, current_user.person_id)
             
     except Exception as e:
         print(f"Profile error: {e}")
         user_info = None
-        purchases = []
+        purchases, next_cursor, summary = [], None, None
     
-    return render_template("profile.html", user_info=user_info, purchases=purchases)
+    return render_template("profile.html", user_info=user_info, purchases=purchases,
+                         next_cursor=next_cursor, summary=summary)
+
+# Per-customer order counts, spend and points, dropped when they buy something
+profile_summaries = make_cache(maxsize=10000, default_ttl=int(os.getenv('PROFILE_SUMMARY_TTL', '300')),
+                               prefix='tm:profile:')
+
+def profile_summary(cur, person_id):
+    try:
+        summary = profile_summaries.get(str(person_id))
+    except Exception as e:
+        print(f"Profile cache error: {e}")
+        summary = None
+    if summary is None:
+        summary = purchase_history.customer_summary(cur, person_id)
+        try:
+            profile_summaries.set(str(person_id), summary)
+        except Exception as e:
+            print(f"Profile cache error: {e}")
+    return summary
+
+def forget_profile_summary(person_id):
+    # Runs after the purchase committed, which a cache outage must not undo for the buyer
+    try:
+        profile_summaries.delete(str(person_id))
+    except Exception as e:
+        print(f"Profile cache error: {e}")
+
+@app.route("/profile/purchases")
+@login_required
+def profile_purchases():
+    """Older purchase history pages for the profile's 'show more' button."""
+    cursor = request.args.get('before')
+    if not purchase_history.decode_cursor(cursor):
+        return jsonify({'error': 'invalid cursor'}), 400
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            rows, next_cursor = purchase_history.history_page(cur, current_user.person_id, cursor)
+    except Exception as e:
+        print(f"Purchase history error: {e}")
+        return jsonify({'error': 'unavailable'}), 500
+    
+    return jsonify({
+        'purchases': [{
+            'purchase_id': row[0],
+            'purchased_on': row[1].strftime('%b %d, %Y') if row[1] else 'Unknown',
+            'amount': f"{row[2]:.2f}",
+            'status': row[3],
+            'title': row[4] or 'No tickets',
+            'event_date': row[5].strftime('%b %d, %Y at %I:%M %p') if row[5] else 'Date TBA',
+            'venue': row[6] or '',
+            'tickets': row[7],
+        } for row in rows],
+        'next': next_cursor,
+    })
 
 @app.route("/profile/edit", methods=["GET", "POST"])
 @login_required
@@ -624,6 +873,7 @@ def edit_profile():
                     WHERE person_id = %s
                 """, (first_name, last_name, email, phone, date_of_birth, current_user.person_id))
                 conn.commit()
+                forget_user(current_user.id)
                 flash("Profile updated successfully!", "success")
                 return redirect(url_for('profile'))
                 
@@ -651,133 +901,145 @@ def edit_profile():
 @login_required
 def select_tickets(event_id):
     selected_tickets = request.form.getlist('tickets[]')
+    quantity = max(request.form.get('quantity', 0, type=int), 0)
+    
+    if not waiting_room.enter(event_id):
+        flash("This event is very busy right now. You are in line for tickets.", "info")
+        return redirect(url_for('event_queue', event_id=event_id))
     
-    if not selected_tickets:
+    if not selected_tickets and not quantity:
         flash("Please select at least one ticket.", "error")
         return redirect(url_for('event_details', event_id=event_id))
     
-    # Store in session for checkout
-    session['cart'] = {
-        'event_id': event_id,
-        'ticket_ids': selected_tickets
-    }
+    if len(set(selected_tickets)) > MAX_BEST_AVAILABLE or quantity > MAX_BEST_AVAILABLE:
+        flash(f"You can reserve at most {MAX_BEST_AVAILABLE} tickets at a time.", "error")
+        return redirect(url_for('event_details', event_id=event_id))
+    
+    # Hold the tickets until checkout so nobody else can buy them meanwhile
+    previous = carts.load()
+    
+    def hold_selection():
+        with get_conn() as conn, conn.cursor() as cur:
+            released = []
+            if previous:
+                released = ticket_claims.release_holds(cur, current_user.person_id, previous['ticket_ids'])
+            if selected_tickets:
+                tickets = ticket_claims.claim_tickets(cur, selected_tickets, held_by=current_user.person_id,
+                                                      event_id=event_id)
+            else:
+                # Best adjacent seats from the in-memory seat map
+                tickets = ticket_claims.claim_best_block(
+                    cur, seat_maps, get_conn, event_id, quantity,
+                    section=request.form.get('section') or None,
+                    max_price=request.form.get('max_price', type=float),
+                    ticket_type=request.form.get('ticket_type') or None)
+            ticket_claims.hold_tickets(cur, tickets, current_user.person_id, HOLD_SECONDS)
+            # Everything checkout shows, so it renders without queries
+            cart = build_cart(
+                cur, event_id, [ticket[0] for ticket in tickets],
+                held_until=(datetime.now() + timedelta(seconds=HOLD_SECONDS)).strftime('%H:%M'),
+                # Idempotency key of this basket's /purchase/complete
+                checkout_key=secrets.token_urlsafe(16))
+            conn.commit()
+        return cart, released
+    
+    try:
+        cart, released = ticket_claims.with_retry(hold_selection)
+    except ticket_claims.TicketsUnavailable as e:
+        seat_maps.set_available(event_id, e.ticket_ids, False)
+        if selected_tickets:
+            flash("Sorry, some of those tickets were just taken. Please choose again.", "error")
+        else:
+            flash(f"Sorry, there are not {quantity} seats available together.", "error")
+        return redirect(url_for('event_details', event_id=event_id))
+    except Exception as e:
+        print(f"Ticket hold error: {e}")
+        flash("Could not reserve your tickets. Please try again.", "error")
+        return redirect(url_for('event_details', event_id=event_id))
+    
+    holds_released(released)
+    seat_maps.set_available(event_id, cart['ticket_ids'], False)
+    carts.save(cart)
     
     return redirect(url_for('checkout'))
 
 @app.route("/checkout")
 @login_required
 def checkout():
-    cart = session.get('cart')
+    cart = carts.load()
     if not cart:
         flash("Your cart is empty.", "error")
         return redirect(url_for('home'))
     
-    try:
-        with get_conn() as conn, conn.cursor() as cur:
-            # Get event details
-            cur.execute("""
-                SELECT e.event_id, e.title, e.start_time, v.v_name, v.city
-                FROM events e
-                JOIN venues v ON e.venue_id = v.venue_id
-                WHERE e.event_id = %s
-            """, (cart['event_id'],))
-            event = cur.fetchone()
-            
-            # Get ticket details
-            placeholders = ','.join(['%s'] * len(cart['ticket_ids']))
-            cur.execute(f"""
-                SELECT 
-                    t.ticket_id,
-                    t.face_value,
-                    t.currency,
-                    s.seat_section,
-                    s.row_label,
-                    s.seat_number,
-                    CASE WHEN vt.ticket_id IS NOT NULL THEN 'VIP' ELSE 'Regular' END as ticket_type
-                FROM tickets t
-                LEFT JOIN seats s ON t.seat_id = s.seat_id
-                LEFT JOIN vip_tickets vt ON t.ticket_id = vt.ticket_id
-                WHERE t.ticket_id IN ({placeholders})
-                    AND t.ticket_status = 'available'
-            """, cart['ticket_ids'])
-            tickets = cur.fetchall()
-            
-            total = sum(ticket[1] for ticket in tickets)
-            
-    except Exception as e:
-        print(f"Checkout error: {e}")
-        flash("Error loading checkout. Please try again.", "error")
-        return redirect(url_for('home'))
-    
     return render_template("checkout.html", 
-                         event=event,
-                         tickets=tickets,
-                         total=total)
+                         event=cart['event'],
+                         tickets=cart['tickets'],
+                         total=cart['total'],
+                         held_until=cart.get('held_until'),
+                         checkout_key=cart.get('checkout_key'))
 
 @app.route("/purchase/complete", methods=["POST"])
 @login_required
 def complete_purchase():
-    cart = session.get('cart')
+    cart = carts.load()
+    key = request.form.get('idempotency_key') or None
+    
+    # Replays of a completed checkout (double clicks, browser retries) are
+    # answered from the recorded outcome without touching inventory
+    if key and completed_purchases.get(key) == current_user.person_id:
+        return purchase_completed()
     if not cart:
+        if key:
+            try:
+                with get_conn() as conn, conn.cursor() as cur:
+                    if ticket_claims.completed_request(cur, key, current_user.person_id):
+                        return purchase_completed()
+            except Exception as e:
+                print(f"Purchase replay lookup error: {e}")
         flash("Your cart is empty.", "error")
         return redirect(url_for('home'))
     
     payment_method = request.form.get('payment_method', 'card')
     
-    try:
+    def checkout_basket():
         with get_conn() as conn, conn.cursor() as cur:
-            # Calculate total
-            placeholders = ','.join(['%s'] * len(cart['ticket_ids']))
-            cur.execute(f"""
-                SELECT SUM(face_value)
-                FROM tickets
-                WHERE ticket_id IN ({placeholders})
-            """, cart['ticket_ids'])
-            total = cur.fetchone()[0] or 0
-            
-            # Create purchase
-            cur.execute("""
-                INSERT INTO purchases (customer_id, total_amount, purch_status)
-                VALUES (%s, %s, 'completed')
-            """, (current_user.person_id, total))
-            purchase_id = cur.lastrowid
-            
-            # Add purchase items
-            for ticket_id in cart['ticket_ids']:
-                cur.execute("""
-                    SELECT face_value FROM tickets WHERE ticket_id = %s
-                """, (ticket_id,))
-                price = cur.fetchone()[0]
-                
-                cur.execute("""
-                    INSERT INTO purchase_items (purchase_id, ticket_id, price_paid)
-                    VALUES (%s, %s, %s)
-                """, (purchase_id, ticket_id, price))
-                
-                # Update ticket status
-                cur.execute("""
-                    UPDATE tickets SET ticket_status = 'sold' WHERE ticket_id = %s
-                """, (ticket_id,))
-            
-            # Create payment record
-            transaction_ref = f"TX-{purchase_id}-{secrets.token_hex(4).upper()}"
-            cur.execute("""
-                INSERT INTO payments (purchase_id, amount, method, transaction_ref, payment_status)
-                VALUES (%s, %s, %s, %s, 'ok')
-            """, (purchase_id, total, payment_method, transaction_ref))
-            
+            if key and ticket_claims.register_request(cur, key, current_user.person_id):
+                return False
+            tickets = ticket_claims.claim_tickets(cur, cart['ticket_ids'], held_by=current_user.person_id,
+                                                  event_id=cart['event_id'])
+            purchase_id = ticket_claims.record_purchase(cur, current_user.person_id, tickets, payment_method)
+            if key:
+                ticket_claims.finish_request(cur, key, purchase_id)
             conn.commit()
-            
-            # Clear cart
-            session.pop('cart', None)
-            
-            flash("Purchase completed successfully! Check your profile for ticket details.", "success")
-            return redirect(url_for('profile'))
-            
+        return True
+    
+    try:
+        purchased = ticket_claims.with_retry(checkout_basket)
+    except ticket_claims.TicketsUnavailable as e:
+        seat_maps.set_available(cart['event_id'], e.ticket_ids, False)
+        carts.clear()
+        flash("Sorry, some of your tickets were just sold. Please choose again.", "error")
+        return redirect(url_for('event_details', event_id=cart['event_id']))
     except Exception as e:
         print(f"Purchase error: {e}")
         flash("An error occurred during purchase. Please try again.", "error")
         return redirect(url_for('checkout'))
+    
+    if key:
+        completed_purchases.set(key, current_user.person_id)
+    if purchased:
+        # Sales only move the home page's availability; search results
+        # catch up with prices within SEARCH_CACHE_TTL
+        drop_home_fragments()
+        seat_maps.set_available(cart['event_id'], cart['ticket_ids'], False)
+    return purchase_completed()
+
+def purchase_completed():
+    carts.clear()
+    forget_profile_summary(current_user.person_id)
+    
+    flash("Purchase completed successfully! Check your profile for ticket details.", "success")
+    return redirect(url_for('profile'))
 
 # ============== MAINTENANCE (ADMIN ONLY) ==============
 
@@ -786,6 +1048,40 @@ def complete_purchase():
 def maintenance():
     return render_template("maintenance.html")
 
+@app.route("/maintenance/db-pool")
+@admin_required
+def db_pool_status():
+    return jsonify(pool_stats())
+
+@app.route("/maintenance/waiting-room")
+@admin_required
+def waiting_room_status():
+    return jsonify(waiting_room.stats())
+
+@app.route("/maintenance/lookup/<entity>")
+@admin_required
+def admin_lookup(entity):
+    """Options for the admin forms' async pickers (static/lookup.js)."""
+    if entity not in lookups.LOOKUPS:
+        return jsonify({'error': 'unknown entity'}), 404
+    after = request.args.get('after')
+    if after:
+        after = lookups.decode_cursor(after)
+        if after is None:
+            return jsonify({'error': 'invalid cursor'}), 400
+    parents = {name: request.args.get(name, type=int) for name in ('event_id', 'venue_id')
+               if request.args.get(name, type=int) is not None}
+    flags = request.args.getlist('flag')
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            items, next_cursor = lookups.lookup(cur, entity, request.args.get('q', '').strip(),
+                                                parents=parents, flags=flags, after=after)
+    except Exception as e:
+        print(f"Lookup error: {e}")
+        return jsonify({'error': 'unavailable'}), 500
+
+    return jsonify({'items': [{'id': item[0], 'label': item[1]} for item in items], 'next': next_cursor})
+
 @app.route("/imprint")
 def imprint():
     return render_template("imprint.html")
@@ -901,7 +1197,9 @@ def events_create():
                     VALUES (%s, %s, %s)
                 """, (event_id, genre, is_outdoor))
             
+            event_summary.refresh_event(cur, event_id)
             conn.commit()
+            catalog_changed(event_id=event_id)
         
         message = "Event created successfully."
         if image_path:
@@ -910,28 +1208,10 @@ def events_create():
     except Exception as e:
         return render_template("feedback.html", title="Create Event", message=f"Error: {e}")
 
-def get_events():
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-          SELECT event_id, CONCAT(title,' — ', DATE_FORMAT(start_time,'%Y-%m-%d %H:%i')) AS label
-          FROM events ORDER BY start_time DESC
-        """)
-        return cur.fetchall()
-
-def get_seats():
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-          SELECT s.seat_id,
-                 CONCAT(COALESCE(s.seat_section,''),'-',COALESCE(s.row_label,''),'-',COALESCE(s.seat_number,''),' @ ',v.v_name) AS label
-          FROM seats s JOIN venues v ON v.venue_id = s.venue_id
-          ORDER BY v.v_name, s.seat_section, s.row_label, s.seat_number
-        """)
-        return cur.fetchall()
-
 @app.route("/tickets/new")
 @admin_required
 def tickets_new():
-    return render_template("tickets_new.html", events=get_events(), seats=get_seats())
+    return render_template("tickets_new.html")
 
 @app.route("/tickets/create", methods=["POST"])
 @admin_required
@@ -972,26 +1252,19 @@ def tickets_create():
                     VALUES (%s, %s, %s)
                 """, (ticket_id, refundable, refund_deadline))
             
+            event_summary.ticket_added(cur, event_id, face_value, ticket_status)
             conn.commit()
+            catalog_changed()
+            seat_maps.invalidate(event_id)
         return render_template("feedback.html", title="Create Ticket", 
                              message=f"{ticket_type.upper()} ticket created successfully.")
     except Exception as e:
         return render_template("feedback.html", title="Create Ticket", message=f"Error: {e}")
 
-def get_customers_for_dropdown():
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-          SELECT c.person_id,
-                 CONCAT(p.first_name,' ',p.last_name,' — ',COALESCE(p.email,'no email')) AS label
-          FROM customers c JOIN persons p ON p.person_id=c.person_id
-          ORDER BY p.last_name, p.first_name
-        """)
-        return cur.fetchall()
-
 @app.route("/purchases/new")
 @admin_required
 def purchases_new():
-    return render_template("purchases_new.html", customers=get_customers_for_dropdown())
+    return render_template("purchases_new.html")
 
 @app.route("/purchases/create", methods=["POST"])
 @admin_required
@@ -1011,19 +1284,10 @@ def purchases_create():
     except Exception as e:
         return render_template("feedback.html", title="Create Purchase", message=f"Error: {e}")
 
-def get_purchases_for_dropdown():
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-          SELECT purchase_id,
-                 CONCAT('#',purchase_id,' — ',DATE_FORMAT(purchase_time,'%Y-%m-%d %H:%i'),' — €',total_amount) AS label
-          FROM purchases ORDER BY purchase_time DESC
-        """)
-        return cur.fetchall()
-
 @app.route("/payments/new")
 @admin_required
 def payments_new():
-    return render_template("payments_new.html", purchases=get_purchases_for_dropdown())
+    return render_template("payments_new.html")
 
 @app.route("/payments/create", methods=["POST"])
 @admin_required
@@ -1045,18 +1309,10 @@ def payments_create():
     except Exception as e:
         return render_template("feedback.html", title="Create Payment", message=f"Error: {e}")
 
-def get_persons_for_dropdown():
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-          SELECT person_id, CONCAT(first_name,' ',last_name,' — ',COALESCE(email,'no email')) AS label
-          FROM persons ORDER BY last_name, first_name
-        """)
-        return cur.fetchall()
-
 @app.route("/event_organizers/new")
 @admin_required
 def event_organizers_new():
-    return render_template("event_organizers_new.html", events=get_events(), persons=get_persons_for_dropdown())
+    return render_template("event_organizers_new.html")
 
 @app.route("/event_organizers/create", methods=["POST"])
 @admin_required
@@ -1075,27 +1331,10 @@ def event_organizers_create():
     except Exception as e:
         return render_template("feedback.html", title="Assign Organizer", message=f"Error: {e}")
 
-def get_available_tickets():
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-          SELECT t.ticket_id,
-                 CONCAT('#',t.ticket_id,' — ',e.title,' — ',
-                        COALESCE(CONCAT(s.seat_section,'-',s.row_label,'-',s.seat_number),'GENERAL'),
-                        ' — €',t.face_value) AS label
-          FROM tickets t
-          JOIN events e ON e.event_id=t.event_id
-          LEFT JOIN seats s ON s.seat_id=t.seat_id
-          WHERE NOT EXISTS (SELECT 1 FROM purchase_items pi WHERE pi.ticket_id=t.ticket_id)
-          ORDER BY e.start_time DESC, t.ticket_id
-        """)
-        return cur.fetchall()
-
 @app.route("/purchase_items/new")
 @admin_required
 def purchase_items_new():
-    return render_template("purchase_items_new.html",
-                           purchases=get_purchases_for_dropdown(),
-                           tickets=get_available_tickets())
+    return render_template("purchase_items_new.html")
 
 @app.route("/purchase_items/create", methods=["POST"])
 @admin_required
@@ -1117,7 +1356,7 @@ def purchase_items_create():
 @app.route("/event-venue/new")
 @admin_required
 def event_venue_new():
-    return render_template("events_venue_new.html", events=get_events(), venues=get_venues())
+    return render_template("events_venue_new.html")
 
 @app.route("/event-venue/create", methods=["POST"])
 @admin_required
@@ -1127,7 +1366,9 @@ def event_venue_create():
     try:
         with get_conn() as conn, conn.cursor() as cur:
             cur.execute("UPDATE events SET venue_id=%s WHERE event_id=%s", (venue_id, event_id))
+            event_summary.refresh_event(cur, event_id, counts=False)
             conn.commit()
+            catalog_changed(event_id=event_id)
         return render_template("feedback.html", title="Link Event ↔ Venue", message="Event venue updated.")
     except Exception as e:
         return render_template("feedback.html", title="Link Event ↔ Venue", message=f"Error: {e}")
@@ -1169,16 +1410,7 @@ def persons_delete():
             return render_template("feedback.html", title="Delete Person", message=f"Error: {e}")
     
     # GET request - show form
-    try:
-        with get_conn() as conn, conn.cursor() as cur:
-            cur.execute("""
-                SELECT person_id, CONCAT(first_name, ' ', last_name, ' (', COALESCE(email, 'no email'), ')') AS label
-                FROM persons ORDER BY last_name, first_name
-            """)
-            persons = cur.fetchall()
-    except:
-        persons = []
-    return render_template("delete_form.html", title="Delete Person", items=persons, 
+    return render_template("delete_form.html", title="Delete Person", lookup="persons", 
                          item_name="person_id", action_url=url_for('persons_delete'))
 
 @app.route("/venues/delete", methods=["GET", "POST"])
@@ -1202,16 +1434,7 @@ def venues_delete():
         except Exception as e:
             return render_template("feedback.html", title="Delete Venue", message=f"Error: {e}")
     
-    try:
-        with get_conn() as conn, conn.cursor() as cur:
-            cur.execute("""
-                SELECT venue_id, CONCAT(v_name, ' - ', COALESCE(city, ''), ', ', COALESCE(country, '')) AS label
-                FROM venues ORDER BY v_name
-            """)
-            venues = cur.fetchall()
-    except:
-        venues = []
-    return render_template("delete_form.html", title="Delete Venue", items=venues,
+    return render_template("delete_form.html", title="Delete Venue", lookup="venues",
                          item_name="venue_id", action_url=url_for('venues_delete'))
 
 @app.route("/events/delete", methods=["GET", "POST"])
@@ -1242,20 +1465,13 @@ def events_delete():
                 # Finally delete the event
                 cur.execute("DELETE FROM events WHERE event_id = %s", (event_id,))
                 conn.commit()
+                catalog_changed(event_id=event_id)
+                seat_maps.invalidate(event_id)
             return render_template("feedback.html", title="Delete Event", message="Event and all related data deleted successfully.")
         except Exception as e:
             return render_template("feedback.html", title="Delete Event", message=f"Error: {e}")
     
-    try:
-        with get_conn() as conn, conn.cursor() as cur:
-            cur.execute("""
-                SELECT e.event_id, CONCAT(e.title, ' - ', DATE_FORMAT(e.start_time, '%Y-%m-%d')) AS label
-                FROM events e ORDER BY e.start_time DESC
-            """)
-            events = cur.fetchall()
-    except:
-        events = []
-    return render_template("delete_form.html", title="Delete Event", items=events,
+    return render_template("delete_form.html", title="Delete Event", lookup="events",
                          item_name="event_id", action_url=url_for('events_delete'))
 
 @app.route("/tickets/delete", methods=["GET", "POST"])
@@ -1273,30 +1489,27 @@ def tickets_delete():
                     return render_template("feedback.html", title="Delete Ticket", 
                                          message="Cannot delete ticket: This ticket is part of a purchase. Please delete the purchase first.")
                 
+                cur.execute("SELECT event_id, ticket_status FROM tickets WHERE ticket_id = %s FOR UPDATE", (ticket_id,))
+                ticket = cur.fetchone()
+                
                 # Delete from regular_tickets and vip_tickets first
                 cur.execute("DELETE FROM regular_tickets WHERE ticket_id = %s", (ticket_id,))
                 cur.execute("DELETE FROM vip_tickets WHERE ticket_id = %s", (ticket_id,))
                 
                 # Delete the ticket
                 cur.execute("DELETE FROM tickets WHERE ticket_id = %s", (ticket_id,))
+                if ticket:
+                    event_summary.tickets_changed(cur, ticket[0], ticket[1], None)
+                    event_summary.refresh_min_price(cur, ticket[0])
                 conn.commit()
+                catalog_changed()
+                if ticket:
+                    seat_maps.invalidate(ticket[0])
             return render_template("feedback.html", title="Delete Ticket", message="Ticket deleted successfully.")
         except Exception as e:
             return render_template("feedback.html", title="Delete Ticket", message=f"Error: {e}")
     
-    try:
-        with get_conn() as conn, conn.cursor() as cur:
-            cur.execute("""
-                SELECT t.ticket_id, 
-                       CONCAT('#', t.ticket_id, ' - ', e.title, ' - €', t.face_value, ' (', t.ticket_status, ')') AS label
-                FROM tickets t
-                JOIN events e ON t.event_id = e.event_id
-                ORDER BY t.ticket_id DESC
-            """)
-            tickets = cur.fetchall()
-    except:
-        tickets = []
-    return render_template("delete_form.html", title="Delete Ticket", items=tickets,
+    return render_template("delete_form.html", title="Delete Ticket", lookup="tickets",
                          item_name="ticket_id", action_url=url_for('tickets_delete'))
 
 @app.route("/purchases/delete", methods=["GET", "POST"])
@@ -1319,18 +1532,7 @@ def purchases_delete():
         except Exception as e:
             return render_template("feedback.html", title="Delete Purchase", message=f"Error: {e}")
     
-    try:
-        with get_conn() as conn, conn.cursor() as cur:
-            cur.execute("""
-                SELECT p.purchase_id,
-                       CONCAT('#', p.purchase_id, ' - €', p.total_amount, ' (', p.purch_status, ') - ',
-                              DATE_FORMAT(p.purchase_time, '%Y-%m-%d')) AS label
-                FROM purchases p ORDER BY p.purchase_id DESC
-            """)
-            purchases = cur.fetchall()
-    except:
-        purchases = []
-    return render_template("delete_form.html", title="Delete Purchase", items=purchases,
+    return render_template("delete_form.html", title="Delete Purchase", lookup="purchases",
                          item_name="purchase_id", action_url=url_for('purchases_delete'))
 
 # ============== EDIT OPERATIONS ==============
@@ -1378,16 +1580,7 @@ def persons_edit():
         return render_template("persons_edit_form.html", person=person)
     else:
         # Show selection list
-        try:
-            with get_conn() as conn, conn.cursor() as cur:
-                cur.execute("""
-                    SELECT person_id, CONCAT(first_name, ' ', last_name, ' (', COALESCE(email, 'no email'), ')') AS label
-                    FROM persons ORDER BY last_name, first_name
-                """)
-                persons = cur.fetchall()
-        except:
-            persons = []
-        return render_template("edit_select.html", title="Edit Person", items=persons,
+        return render_template("edit_select.html", title="Edit Person", lookup="persons",
                              item_name="person_id", edit_url="persons_edit")
 
 @app.route("/venues/edit", methods=["GET", "POST"])
@@ -1408,7 +1601,9 @@ def venues_edit():
                     SET v_name = %s, v_address = %s, city = %s, country = %s, capacity = %s
                     WHERE venue_id = %s
                 """, (v_name, v_address, city, country, capacity, venue_id))
+                event_summary.refresh_venue(cur, venue_id)
                 conn.commit()
+                catalog_changed(venue_id=venue_id)
             return render_template("feedback.html", title="Edit Venue", message="Venue updated successfully.")
         except Exception as e:
             return render_template("feedback.html", title="Edit Venue", message=f"Error: {e}")
@@ -1426,16 +1621,7 @@ def venues_edit():
             venue = None
         return render_template("venues_edit_form.html", venue=venue)
     else:
-        try:
-            with get_conn() as conn, conn.cursor() as cur:
-                cur.execute("""
-                    SELECT venue_id, CONCAT(v_name, ' - ', COALESCE(city, ''), ', ', COALESCE(country, '')) AS label
-                    FROM venues ORDER BY v_name
-                """)
-                venues = cur.fetchall()
-        except:
-            venues = []
-        return render_template("edit_select.html", title="Edit Venue", items=venues,
+        return render_template("edit_select.html", title="Edit Venue", lookup="venues",
                              item_name="venue_id", edit_url="venues_edit")
 
 @app.route("/events/edit", methods=["GET", "POST"])
@@ -1452,6 +1638,10 @@ def events_edit():
         image_filename = request.form.get("image_filename") or None
         genre = request.form.get("genre") or None
         is_outdoor = request.form.get("is_outdoor", "0")
+        is_featured = request.form.get("is_featured", "0")
+        featured_priority = request.form.get("featured_priority") or 0
+        featured_from = request.form.get("featured_from") or None
+        featured_until = request.form.get("featured_until") or None
         
         # Handle image upload
         image_path = image_filename
@@ -1469,9 +1659,11 @@ def events_edit():
                 cur.execute("""
                     UPDATE events 
                     SET title = %s, e_description = %s, venue_id = %s, start_time = %s, 
-                        end_time = %s, e_status = %s, image_path = %s
+                        end_time = %s, e_status = %s, image_path = %s,
+                        is_featured = %s, featured_priority = %s, featured_from = %s, featured_until = %s
                     WHERE event_id = %s
-                """, (title, e_description, venue_id, start_time, end_time, e_status, image_path, event_id))
+                """, (title, e_description, venue_id, start_time, end_time, e_status, image_path,
+                      is_featured, featured_priority, featured_from, featured_until, event_id))
                 
                 # Update concert event details if genre provided
                 if genre:
@@ -1481,7 +1673,9 @@ def events_edit():
                         ON DUPLICATE KEY UPDATE genre = %s, is_outdoor = %s
                     """, (event_id, genre, is_outdoor, genre, is_outdoor))
                 
+                event_summary.refresh_event(cur, event_id, counts=False)
                 conn.commit()
+                catalog_changed(event_id=event_id)
             return render_template("feedback.html", title="Edit Event", message="Event updated successfully.")
         except Exception as e:
             return render_template("feedback.html", title="Edit Event", message=f"Error: {e}")
@@ -1491,7 +1685,9 @@ def events_edit():
         try:
             with get_conn() as conn, conn.cursor() as cur:
                 cur.execute("""
-                    SELECT e.*, ce.genre, ce.is_outdoor
+                    SELECT e.event_id, e.title, e.e_description, e.venue_id, e.start_time, e.end_time,
+                           e.e_status, e.image_path, ce.genre, ce.is_outdoor,
+                           e.is_featured, e.featured_priority, e.featured_from, e.featured_until
                     FROM events e
                     LEFT JOIN concert_events ce ON e.event_id = ce.event_id
                     WHERE e.event_id = %s
@@ -1504,16 +1700,7 @@ def events_edit():
             event = None
         return render_template("events_edit_form.html", event=event, venues=get_venues())
     else:
-        try:
-            with get_conn() as conn, conn.cursor() as cur:
-                cur.execute("""
-                    SELECT e.event_id, CONCAT(e.title, ' - ', DATE_FORMAT(e.start_time, '%Y-%m-%d')) AS label
-                    FROM events e ORDER BY e.start_time DESC
-                """)
-                events = cur.fetchall()
-        except:
-            events = []
-        return render_template("edit_select.html", title="Edit Event", items=events,
+        return render_template("edit_select.html", title="Edit Event", lookup="events",
                              item_name="event_id", edit_url="events_edit")
 
 @app.route("/tickets/edit", methods=["GET", "POST"])
@@ -1526,12 +1713,20 @@ def tickets_edit():
         
         try:
             with get_conn() as conn, conn.cursor() as cur:
+                cur.execute("SELECT event_id, ticket_status FROM tickets WHERE ticket_id = %s FOR UPDATE", (ticket_id,))
+                ticket = cur.fetchone()
                 cur.execute("""
                     UPDATE tickets 
                     SET face_value = %s, ticket_status = %s
                     WHERE ticket_id = %s
                 """, (face_value, ticket_status, ticket_id))
+                if ticket:
+                    event_summary.tickets_changed(cur, ticket[0], ticket[1], ticket_status)
+                    event_summary.refresh_min_price(cur, ticket[0])
                 conn.commit()
+                catalog_changed()
+                if ticket:
+                    seat_maps.invalidate(ticket[0])
             return render_template("feedback.html", title="Edit Ticket", message="Ticket updated successfully.")
         except Exception as e:
             return render_template("feedback.html", title="Edit Ticket", message=f"Error: {e}")
@@ -1554,19 +1749,7 @@ def tickets_edit():
             ticket = None
         return render_template("tickets_edit_form.html", ticket=ticket)
     else:
-        try:
-            with get_conn() as conn, conn.cursor() as cur:
-                cur.execute("""
-                    SELECT t.ticket_id, 
-                           CONCAT('#', t.ticket_id, ' - ', e.title, ' - €', t.face_value, ' (', t.ticket_status, ')') AS label
-                    FROM tickets t
-                    JOIN events e ON t.event_id = e.event_id
-                    ORDER BY t.ticket_id DESC
-                """)
-                tickets = cur.fetchall()
-        except:
-            tickets = []
-        return render_template("edit_select.html", title="Edit Ticket", items=tickets,
+        return render_template("edit_select.html", title="Edit Ticket", lookup="tickets",
                              item_name="ticket_id", edit_url="tickets_edit")
 
 @app.route("/purchases/edit", methods=["GET", "POST"])
@@ -1608,18 +1791,7 @@ def purchases_edit():
             purchase = None
         return render_template("purchases_edit_form.html", purchase=purchase)
     else:
-        try:
-            with get_conn() as conn, conn.cursor() as cur:
-                cur.execute("""
-                    SELECT p.purchase_id,
-                           CONCAT('#', p.purchase_id, ' - €', p.total_amount, ' (', p.purch_status, ') - ',
-                                  DATE_FORMAT(p.purchase_time, '%Y-%m-%d')) AS label
-                    FROM purchases p ORDER BY p.purchase_id DESC
-                """)
-                purchases = cur.fetchall()
-        except:
-            purchases = []
-        return render_template("edit_select.html", title="Edit Purchase", items=purchases,
+        return render_template("edit_select.html", title="Edit Purchase", lookup="purchases",
                              item_name="purchase_id", edit_url="purchases_edit")
 
 # ============== GEO-LOCATION ==============
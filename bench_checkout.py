@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for checkout against the database in .env.
+
+Creates a scratch event with a fixed stock of tickets, lets hundreds of
+buyer threads race for them through ticket_claims (the code behind
+complete_purchase) and then checks the result: no ticket may be sold
+twice and the number of sold tickets must equal what the successful
+buyers paid for. The scratch event and its purchases are deleted at the end.
+
+    python bench_checkout.py --buyers 300 --stock 100 --mode specific
+    python bench_checkout.py --buyers 300 --stock 100 --mode best
+"""
+
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import ticket_claims
+from db_connection import open_connection
+from seatmap import SeatMapRegistry
+
+
+def create_stock(stock):
+    conn = open_connection()
+    with conn.cursor() as cur:
+        cur.execute("SELECT venue_id FROM venues ORDER BY venue_id LIMIT 1")
+        venue_id = cur.fetchone()[0]
+        cur.execute("SELECT person_id FROM customers ORDER BY person_id LIMIT 1")
+        customer_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO events (title, venue_id, start_time, e_status)
+            VALUES ('Checkout benchmark', %s, NOW() + INTERVAL 1 YEAR, 'cancelled')
+        """, (venue_id,))
+        event_id = cur.lastrowid
+        cur.executemany("""
+            INSERT INTO tickets (event_id, face_value, ticket_status) VALUES (%s, %s, 'available')
+        """, [(event_id, 20 + i % 5) for i in range(stock)])
+        cur.execute("SELECT ticket_id FROM tickets WHERE event_id = %s", (event_id,))
+        ticket_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    conn.close()
+    return event_id, customer_id, ticket_ids
+
+
+def buyer(mode, event_id, customer_id, ticket_ids, seat_maps, results, start):
+    conn = open_connection()
+    want = random.randint(1, 4)
+    basket = random.sample(ticket_ids, want)
+    retries = [0]
+
+    def attempt():
+        if retries[0]:
+            conn.rollback()
+        retries[0] += 1
+        with conn.cursor() as cur:
+            if mode == 'best':
+                tickets = ticket_claims.claim_best_block(cur, seat_maps, open_connection, event_id, want)
+            else:
+                tickets = ticket_claims.claim_tickets(cur, basket, event_id=event_id)
+            ticket_claims.record_purchase(cur, customer_id, tickets)
+        conn.commit()
+        seat_maps.set_available(event_id, [ticket[0] for ticket in tickets], False)
+        return len(tickets)
+
+    start.wait()
+    began = time.perf_counter()
+    try:
+        bought = ticket_claims.with_retry(attempt)
+        outcome = 'sold'
+    except ticket_claims.TicketsUnavailable:
+        conn.rollback()
+        bought, outcome = 0, 'unavailable'
+    except Exception as e:
+        conn.rollback()
+        bought, outcome = 0, f'error {e.args[0] if e.args else e}'
+    results.append((outcome, bought, retries[0] - 1, time.perf_counter() - began))
+    conn.close()
+
+
+def verify(event_id):
+    conn = open_connection()
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*), COUNT(DISTINCT pi.ticket_id)
+            FROM purchase_items pi JOIN tickets t ON t.ticket_id = pi.ticket_id
+            WHERE t.event_id = %s
+        """, (event_id,))
+        items, distinct_items = cur.fetchone()
+        cur.execute("SELECT COUNT(*) FROM tickets WHERE event_id = %s AND ticket_status = 'sold'",
+                    (event_id,))
+        sold = cur.fetchone()[0]
+    conn.close()
+    return items, distinct_items, sold
+
+
+def cleanup(event_id):
+    conn = open_connection()
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT DISTINCT pi.purchase_id FROM purchase_items pi
+            JOIN tickets t ON t.ticket_id = pi.ticket_id WHERE t.event_id = %s
+        """, (event_id,))
+        purchase_ids = [row[0] for row in cur.fetchall()]
+        if purchase_ids:
+            cur.execute("DELETE FROM purchase_items WHERE purchase_id IN %s", (purchase_ids,))
+            cur.execute("DELETE FROM payments WHERE purchase_id IN %s", (purchase_ids,))
+            cur.execute("DELETE FROM purchases WHERE purchase_id IN %s", (purchase_ids,))
+        cur.execute("DELETE FROM tickets WHERE event_id = %s", (event_id,))
+        cur.execute("DELETE FROM events WHERE event_id = %s", (event_id,))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--buyers', type=int, default=300)
+    parser.add_argument('--stock', type=int, default=100)
+    parser.add_argument('--mode', choices=['specific', 'best'], default='specific',
+                        help="specific: random seats picked up front; "
+                             "best: best adjacent seats from a shared seat map, as select_tickets does")
+    args = parser.parse_args()
+
+    event_id, customer_id, ticket_ids = create_stock(args.stock)
+    try:
+        results = []
+        start = threading.Event()
+        # One worker process's seat maps, shared by all its request threads
+        seat_maps = SeatMapRegistry()
+        threads = [threading.Thread(target=buyer, args=(args.mode, event_id, customer_id,
+                                                        ticket_ids, seat_maps, results, start))
+                   for _ in range(args.buyers)]
+        for t in threads:
+            t.start()
+        began = time.perf_counter()
+        start.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - began
+
+        outcomes = Counter(r[0] for r in results)
+        bought = sum(r[1] for r in results)
+        latencies = sorted(r[3] for r in results)
+        items, distinct_items, sold = verify(event_id)
+        oversold = (items - distinct_items) + max(0, bought - args.stock) + abs(sold - bought)
+
+        print(f"{args.buyers} buyers, {args.stock} tickets, mode={args.mode}, {elapsed:.2f}s")
+        for outcome, count in sorted(outcomes.items()):
+            print(f"  {outcome:12} {count}")
+        print(f"  retries      {sum(r[2] for r in results)}")
+        print(f"  latency p50  {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+        print(f"  tickets bought {bought}, marked sold {sold}, purchase items {items}")
+        print(f"  oversells    {oversold}")
+    finally:
+        cleanup(event_id)
+
+
+if __name__ == '__main__':
+    main()
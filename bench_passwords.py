@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark for login password checks through PasswordHasher.
+
+Fires bursts of concurrent logins (bcrypt verifications) from request-like
+threads at hashers with 1..N worker threads, and reports logins per second,
+per core, latency and how many were turned away by the queue limit. No
+database is involved.
+
+    python bench_passwords.py --logins 64 --clients 32
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from passwords import PasswordHasher, PasswordsBusy, calibrate_rounds
+
+
+def burst(hasher, stored, logins, clients):
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+    remaining = [logins]
+
+    def client():
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            began = time.perf_counter()
+            try:
+                ok = hasher.verify('correct horse', stored)
+                assert ok
+            except PasswordsBusy:
+                with lock:
+                    rejected[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - began)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+    latencies.sort()
+    return elapsed, latencies, rejected[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target-ms', type=int, default=250, help="calibration target per hash")
+    parser.add_argument('--rounds', type=int, help="bcrypt cost (calibrated when omitted)")
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=32, help="concurrent request threads")
+    parser.add_argument('--max-pending', type=int, default=32)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    rounds = args.rounds or calibrate_rounds(args.target_ms)
+    print(f"bcrypt cost {rounds}, {cores} cores, {args.logins} logins from {args.clients} clients")
+    for workers in sorted({1, max(1, cores // 2), cores}):
+        hasher = PasswordHasher(rounds=rounds, workers=workers, max_pending=args.max_pending)
+        stored = hasher.hash('correct horse')
+        elapsed, latencies, rejected = burst(hasher, stored, args.logins, args.clients)
+        done = len(latencies)
+        if not done:
+            print(f"  {workers} workers: every login rejected")
+            continue
+        rate = done / elapsed
+        p50 = latencies[done // 2] * 1000
+        p95 = latencies[min(done - 1, int(done * 0.95))] * 1000
+        print(f"  {workers} workers: {rate:6.1f} logins/s ({rate / min(workers, cores):5.1f} per core)  "
+              f"p50 {p50:6.0f} ms  p95 {p95:6.0f} ms  rejected {rejected}")
+
+
+if __name__ == '__main__':
+    main()
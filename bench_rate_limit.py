@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the rate limiter's per-request overhead.
+
+Times LocalBuckets.take on its own and a limited Flask view against the
+same view undecorated, for allowed and rejected requests, across a
+spread of client keys. No database or Redis is involved.
+
+    python bench_rate_limit.py --requests 100000
+"""
+
+import argparse
+import time
+
+from flask import Flask
+
+from rate_limit import LocalBuckets, RateLimiter
+
+
+def per_call(fn, n):
+    began = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - began) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=10000, help="distinct client keys")
+    args = parser.parse_args()
+    n, clients = args.requests, args.clients
+
+    buckets = LocalBuckets()
+    print(f"take(), allowed      {per_call(lambda i: buckets.take(f'c{i % clients}', 1e9, 10), n):6.2f} us")
+    print(f"take(), rejected     {per_call(lambda i: buckets.take(f'c{i % clients}', 1e-9, 0), n):6.2f} us")
+
+    app = Flask(__name__)
+    app.secret_key = 'bench'
+    limiter = RateLimiter(LocalBuckets())
+
+    def view():
+        return 'ok'
+
+    allowed = limiter.limit('allowed', 1e9, 10)(view)
+    rejected = limiter.limit('rejected', 1e-9, 0)(view)
+
+    def call(target):
+        def run(i):
+            with app.test_request_context(environ_base={'REMOTE_ADDR': f'10.0.{i % clients // 256}.{i % 256}'}):
+                target()
+        return run
+
+    baseline = per_call(call(view), n)
+    print(f"request, no limiter  {baseline:6.2f} us")
+    for name, target in (('allowed', allowed), ('rejected', rejected)):
+        cost = per_call(call(target), n)
+        print(f"request, {name:9}   {cost:6.2f} us  (+{cost - baseline:.2f})")
+
+
+if __name__ == '__main__':
+    main()
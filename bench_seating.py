@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark for best-available seat allocation on synthetic stadium layouts.
+
+Builds SeatMaps in memory (no database) for venues of increasing size,
+sells a share of the seats, either scattered at random or in clusters
+like real on-sales, and times SeatMap.best_block for a range of group
+sizes with and without a price cap.
+
+    python bench_seating.py --sold 0.7
+"""
+
+import argparse
+import random
+import time
+
+from seatmap import SeatMap
+
+LAYOUTS = {
+    # name: (sections, rows per section, seats per row)
+    'arena 12k': (24, 20, 25),
+    'stadium 30k': (40, 25, 30),
+    'stadium 60k': (60, 40, 25),
+}
+
+
+def stadium(sections, rows, seats, sold, clustered):
+    tickets = []
+    ticket_id = 1
+    for section in range(sections):
+        # Lower bowl sections are dearer than the upper tier
+        price = 150 if section < sections // 3 else 90 if section < 2 * sections // 3 else 45
+        for row in range(rows):
+            for seat in range(1, seats + 1):
+                tickets.append({
+                    'ticket_id': ticket_id, 'price': price, 'available': True,
+                    'section': f'S{section + 1:02d}', 'row': str(row + 1), 'seat': str(seat),
+                    'type': 'Regular', 'vip_level': None, 'perks': None, 'quality': None,
+                })
+                ticket_id += 1
+    target = int(len(tickets) * sold)
+    if clustered:
+        # Groups of 1-6 sold together, front sections first
+        i = 0
+        while target > 0 and i < len(tickets):
+            group = min(random.randint(1, 6), target)
+            for t in tickets[i:i + group]:
+                t['available'] = False
+            target -= group
+            i += group + random.choice((0, 0, 0, 1, 2))
+    else:
+        for t in random.sample(tickets, target):
+            t['available'] = False
+    return tickets
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - began)
+    times.sort()
+    return result, times[len(times) // 2] * 1000, times[-1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sold', type=float, default=0.7, help="share of seats already sold")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    for name, layout in LAYOUTS.items():
+        for clustered in (False, True):
+            rows = stadium(*layout, sold=args.sold, clustered=clustered)
+            began = time.perf_counter()
+            seat_map = SeatMap(1, rows)
+            build_ms = (time.perf_counter() - began) * 1000
+            print(f"\n{name} ({len(rows)} seats, {seat_map.available_count()} free, "
+                  f"{'clustered' if clustered else 'scattered'} sales), built in {build_ms:.0f} ms")
+            for quantity in (1, 2, 4, 6, 8):
+                for max_price in (None, 90):
+                    block, p50, worst = timed(
+                        lambda: seat_map.best_block(quantity, max_price=max_price), args.repeat)
+                    found = 'none' if block is None else f"{len(block)} seats"
+                    cap = f"<= {max_price}" if max_price else "any price"
+                    print(f"  {quantity} seats, {cap:9}  p50 {p50:6.2f} ms  max {worst:6.2f} ms  ({found})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    """Process-local LRU cache with per-entry TTL."""
+
+    def __init__(self, maxsize=1024, default_ttl=60):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """Shared cache in Redis, so invalidations reach every worker process."""
+
+    def __init__(self, url, prefix='tm:', default_ttl=60):
+        import redis  # optional dependency, only needed when CACHE_URL is set
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key, default=None):
+        raw = self._client.get(self.prefix + key)
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+
+def make_cache(maxsize=1024, default_ttl=60, prefix='tm:'):
+    """Cache backend chosen by CACHE_URL: Redis when set, process-local otherwise."""
+    url = os.getenv('CACHE_URL')
+    if url:
+        try:
+            return RedisCache(url, prefix=prefix, default_ttl=default_ttl)
+        except ImportError:
+            print("CACHE_URL is set but the redis package is not installed; using a local cache")
+    return LocalCache(maxsize=maxsize, default_ttl=default_ttl)
+
+
+class PrefixCache:
+    """LRU of typeahead candidate lists that can answer longer queries from shorter ones.
+
+    Entries are lists of (row, haystack) pairs, where haystack holds the
+    lower-cased fields the query is matched against. When `q` misses but a
+    complete entry exists for one of its prefixes, that entry's candidates
+    are narrowed in Python to the ones still containing `q`; a substring of
+    a field contains every shorter prefix of it, so nothing is lost.
+    Entries cut off at a candidate limit are not complete and only serve
+    exact repeats.
+    """
+
+    def __init__(self, maxsize=2048, ttl=30, min_prefix=2):
+        self.ttl = ttl
+        self.min_prefix = min_prefix
+        self._cache = LocalCache(maxsize=maxsize, default_ttl=ttl)
+
+    def get(self, query):
+        entry = self._cache.get(query)
+        if entry is not None:
+            return entry[0]
+        for end in range(len(query) - 1, self.min_prefix - 1, -1):
+            entry = self._cache.get(query[:end])
+            if entry is None or not entry[1]:
+                continue
+            rows, _, expires_at = entry
+            narrowed = [(row, haystack) for row, haystack in rows
+                        if any(query in field for field in haystack)]
+            # A narrowed entry never outlives the data it was derived from
+            remaining = expires_at - time.monotonic()
+            if remaining > 0:
+                self._cache.set(query, (narrowed, True, expires_at), ttl=remaining)
+            return narrowed
+        return None
+
+    def put(self, query, rows, complete):
+        self._cache.set(query, (rows, complete, time.monotonic() + self.ttl))
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,86 @@
+"""
+Server-side shopping carts.
+
+The session cookie only carries a random cart id; the cart itself lives in
+a cache backend from cache.make_cache (process-local, or Redis when
+CACHE_URL is set, which multi-worker deployments need). A cart holds
+everything the checkout page shows, so rendering it costs no queries:
+
+    {'event_id': 12,
+     'event': (event_id, title, start_time, venue_name, city),
+     'tickets': [(ticket_id, face_value, currency, section, row, seat, type), ...],
+     'ticket_ids': ['101', '102'],
+     'total': Decimal('180.00'),
+     'held_until': '20:15',
+     'checkout_key': '...'}
+
+Prices and labels are a snapshot from when the tickets were held;
+completing the purchase re-reads and locks the tickets in one query.
+"""
+
+import secrets
+
+from flask import session
+
+CART_QUERY = """
+    SELECT
+        t.ticket_id,
+        t.face_value,
+        t.currency,
+        s.seat_section,
+        s.row_label,
+        s.seat_number,
+        CASE WHEN vt.ticket_id IS NOT NULL THEN 'VIP' ELSE 'Regular' END as ticket_type,
+        e.event_id,
+        e.title,
+        e.start_time,
+        v.v_name,
+        v.city
+    FROM tickets t
+    JOIN events e ON t.event_id = e.event_id
+    JOIN venues v ON e.venue_id = v.venue_id
+    LEFT JOIN seats s ON t.seat_id = s.seat_id
+    LEFT JOIN vip_tickets vt ON t.ticket_id = vt.ticket_id
+    WHERE t.ticket_id IN ({placeholders})
+    ORDER BY t.ticket_id
+"""
+
+
+class CartStore:
+    """Carts keyed by a random id kept in the session."""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+
+    def load(self):
+        cart_id = session.get('cart_id')
+        if not cart_id:
+            return None
+        return self.backend.get(cart_id)
+
+    def save(self, cart):
+        cart_id = session.get('cart_id') or secrets.token_urlsafe(16)
+        self.backend.set(cart_id, cart, ttl=self.ttl)
+        session['cart_id'] = cart_id
+
+    def clear(self):
+        cart_id = session.pop('cart_id', None)
+        if cart_id:
+            self.backend.delete(cart_id)
+
+
+def build_cart(cur, event_id, ticket_ids, **extra):
+    """Snapshot the tickets' prices, seat labels and event into a new cart."""
+    cur.execute(CART_QUERY.format(placeholders=','.join(['%s'] * len(ticket_ids))), list(ticket_ids))
+    rows = cur.fetchall()
+    tickets = [row[:7] for row in rows]
+    event = rows[0][7:] if rows else None
+    return {
+        'event_id': event_id,
+        'event': event,
+        'tickets': tickets,
+        'ticket_ids': [str(ticket[0]) for ticket in tickets],
+        'total': sum(ticket[1] for ticket in tickets),
+        **extra,
+    }
@@ -15,8 +15,12 @@ DROP TABLE IF EXISTS vip_tickets;
 DROP TABLE IF EXISTS purchases;
 DROP TABLE IF EXISTS payments;
 DROP TABLE IF EXISTS purchase_items;
+DROP TABLE IF EXISTS purchase_requests;
 DROP TABLE IF EXISTS performances;
 DROP TABLE IF EXISTS event_organizers;
+DROP TABLE IF EXISTS event_counter_shards;
+DROP TABLE IF EXISTS event_summary;
+DROP TABLE IF EXISTS schema_migrations;
 
 
 
@@ -90,6 +94,7 @@ CREATE TABLE IF NOT EXISTS seats (
     seat_number     VARCHAR(10),
     seat_label      VARCHAR(100),
     is_accessible   TINYINT(1) DEFAULT 0,
+    quality         SMALLINT NULL,
     CONSTRAINT uq_seat_venue_section_row_seat UNIQUE (venue_id, seat_section, row_label, seat_number),
     CONSTRAINT fk_seats_venue FOREIGN KEY (venue_id) REFERENCES venues(venue_id) ON DELETE CASCADE
 ) ENGINE=InnoDB;
@@ -136,6 +141,8 @@ CREATE TABLE IF NOT EXISTS tickets (
     face_value      DECIMAL(10,2) NOT NULL DEFAULT 0.00,
     currency        CHAR(3) DEFAULT 'EUR',
     ticket_status          VARCHAR(20) NOT NULL DEFAULT 'available',
+    hold_expires_at DATETIME NULL,
+    held_by         INT NULL,
     issued_at       DATETIME,
     created_at      DATETIME DEFAULT CURRENT_TIMESTAMP,
     CONSTRAINT uq_event_seat UNIQUE (event_id, seat_id),
@@ -201,6 +208,16 @@ CREATE TABLE IF NOT EXISTS purchase_items (
 ) ENGINE=InnoDB;
 
 
+-- Idempotency keys of /purchase/complete, so retried submits replay the first outcome
+CREATE TABLE IF NOT EXISTS purchase_requests (
+    idempotency_key  VARCHAR(64) PRIMARY KEY,
+    person_id        INT NOT NULL,
+    purchase_id      INT NULL,
+    created_at       DATETIME DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_purchase_requests_purchase FOREIGN KEY (purchase_id) REFERENCES purchases(purchase_id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+
 -- Performances
 CREATE TABLE IF NOT EXISTS performances (
     performance_id  INT AUTO_INCREMENT PRIMARY KEY,
@@ -253,14 +270,71 @@ UPDATE events SET image_path = 'cold.jpg' WHERE event_id = 47;
 UPDATE events SET image_path = 'imagine.jpg' WHERE event_id = 48;
 UPDATE events SET image_path = 'arctic.jpg' WHERE event_id = 49;
 
+-- Featured slot on the home page: highest priority wins inside its schedule window
+
+ALTER TABLE events
+ADD COLUMN is_featured TINYINT(1) NOT NULL DEFAULT 0 AFTER image_path,
+ADD COLUMN featured_priority INT NOT NULL DEFAULT 0 AFTER is_featured,
+ADD COLUMN featured_from DATETIME NULL AFTER featured_priority,
+ADD COLUMN featured_until DATETIME NULL AFTER featured_from;
+
+-- Keep featuring The Weeknd, which the home page used to pick by title
+UPDATE events SET is_featured = 1 WHERE title LIKE '%Weeknd%';
+
+
+-- Pre-aggregated listing data, one row per event (maintained by event_summary.py)
+CREATE TABLE IF NOT EXISTS event_summary (
+    event_id          INT PRIMARY KEY,
+    title             VARCHAR(255) NOT NULL,
+    e_description     TEXT,
+    start_time        DATETIME NOT NULL,
+    e_status          VARCHAR(20) NOT NULL,
+    venue_name        VARCHAR(200),
+    city              VARCHAR(100),
+    genre             VARCHAR(100),
+    image_path        VARCHAR(255),
+    min_price         DECIMAL(10,2) NULL,
+    available_count   INT NOT NULL DEFAULT 0,
+    sold_count        INT NOT NULL DEFAULT 0,
+    updated_at        DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    CONSTRAINT fk_event_summary_event FOREIGN KEY (event_id) REFERENCES events(event_id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Uncompacted availability deltas of event_summary, spread over a few rows per event
+CREATE TABLE IF NOT EXISTS event_counter_shards (
+    event_id          INT NOT NULL,
+    shard             SMALLINT NOT NULL,
+    available_count   INT NOT NULL DEFAULT 0,
+    sold_count        INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, shard),
+    CONSTRAINT fk_event_counter_shards_event FOREIGN KEY (event_id) REFERENCES events(event_id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
 
 -- Indexes
 CREATE INDEX idx_events_start_time ON events(start_time);
-CREATE INDEX idx_tickets_event ON tickets(event_id);
+CREATE INDEX idx_events_status_start ON events(e_status, start_time);
+CREATE INDEX idx_events_featured ON events(is_featured, e_status, featured_priority DESC, start_time);
+CREATE INDEX idx_event_summary_status_start ON event_summary(e_status, start_time);
+CREATE INDEX idx_event_summary_genre_start ON event_summary(genre, e_status, start_time);
+CREATE INDEX idx_tickets_event_status_price ON tickets(event_id, ticket_status, face_value);
 CREATE INDEX idx_seats_venue ON seats(venue_id);
+CREATE INDEX idx_persons_last_first ON persons(last_name, first_name);
+CREATE INDEX idx_persons_first ON persons(first_name);
+CREATE INDEX idx_venues_name ON venues(v_name);
+CREATE INDEX idx_events_title ON events(title);
 CREATE INDEX idx_performances_event ON performances(event_id);
 CREATE INDEX idx_tickets_seat ON tickets(seat_id);
 CREATE INDEX idx_tickets_person ON tickets(person_id);
+CREATE INDEX idx_tickets_status_hold ON tickets(ticket_status, hold_expires_at);
+CREATE INDEX idx_concert_events_genre ON concert_events(genre);
+CREATE INDEX idx_purchases_customer_time ON purchases(customer_id, purchase_time);
+CREATE INDEX idx_payments_paid_at ON payments(paid_at, purchase_id, amount);
+
+-- FULLTEXT indexes for SEARCH_BACKEND=fulltext
+CREATE FULLTEXT INDEX ft_events_title_description ON events(title, e_description);
+CREATE FULLTEXT INDEX ft_venues_name ON venues(v_name);
+CREATE FULLTEXT INDEX ft_artists_stage_name ON artists(stage_name);
 
 
 -- Triggers
@@ -1,19 +1,378 @@
 import pymysql
 import os
+import threading
+import time
+from functools import partial, wraps
 from dotenv import load_dotenv
+from flask import g, has_app_context, session
+from query_log import instrument
 
 load_dotenv()
 
-def get_db_connection():
-    connection = pymysql.connect(
-        host=os.getenv('DB_HOST'),
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+def _connect(host=None, port=None):
+    return pymysql.connect(
+        host=host or os.getenv('DB_HOST'),
         user=os.getenv('DB_USER'),
-        port=int(os.getenv('DB_PORT')),
+        port=int(port or os.getenv('DB_PORT')),
         password=os.getenv('DB_PASS'),
         database=os.getenv('DB_NAME'),
     )
-    connection.connect()
-    return connection
+
+
+class PooledConnection:
+    """Proxy around a pymysql connection that goes back to its pool on close.
+
+    Works as a drop-in for the raw connection: ``with get_conn() as conn``
+    returns it to the pool on exit instead of tearing down the socket, and
+    anything not committed by then is rolled back.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of pymysql connections.
+
+    Idle connections are pinged before reuse once they have been idle for
+    ``pre_ping`` seconds and are replaced outright after ``recycle`` seconds,
+    so MySQL's ``wait_timeout`` never hands a dead socket to a request.
+    """
+
+    def __init__(self, connect=_connect, size=10, timeout=5.0, recycle=1800, pre_ping=30):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self._idle = []  # (raw, created_at, returned_at)
+        self._created = {}  # id(raw) -> created_at for checked-out connections
+        self._cond = threading.Condition()
+        self._open = 0
+        self._stats = {'checkouts': 0, 'waits': 0, 'timeouts': 0, 'opened': 0,
+                       'recycled': 0, 'ping_failures': 0}
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"no database connection free after {timeout:.1f}s")
+                self._stats['waits'] += 1
+                self._cond.wait(remaining)
+            self._stats['checkouts'] += 1
+            if self._idle:
+                raw, created_at, returned_at = self._idle.pop()
+            else:
+                raw, created_at, returned_at = None, None, None
+                self._open += 1
+
+        try:
+            raw, created_at = self._check(raw, created_at, returned_at)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created[id(raw)] = created_at
+        return PooledConnection(self, raw)
+
+    def _check(self, raw, created_at, returned_at):
+        now = time.monotonic()
+        if raw is not None and now - created_at > self.recycle:
+            self._count('recycled')
+            self._discard(raw)
+            raw = None
+        elif raw is not None and now - returned_at > self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._count('ping_failures')
+                self._discard(raw)
+                raw = None
+        if raw is None:
+            raw = self._connect()
+            created_at = time.monotonic()
+            self._count('opened')
+        return raw, created_at
+
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    def release(self, raw):
+        with self._cond:
+            created_at = self._created.pop(id(raw), time.monotonic())
+        try:
+            # Leave no half-finished transaction behind for the next borrower
+            raw.rollback()
+        except Exception:
+            self._discard(raw)
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((raw, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, size=self.size, open=self._open,
+                        idle=len(self._idle), in_use=self._open - len(self._idle))
+
+    def dispose(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+
+def open_connection():
+    """A new unpooled connection to the primary, for scripts that need more than the pool holds."""
+    return _connect()
+
+
+def _pool_from_env(connect=_connect):
+    return ConnectionPool(
+        connect=connect,
+        size=int(os.getenv('DB_POOL_SIZE', '10')),
+        timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+        recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        pre_ping=int(os.getenv('DB_POOL_PRE_PING', '30')),
+    )
+
+
+class Replica:
+    """A read replica with its own pool and a cached replication-lag reading."""
+
+    def __init__(self, host, port, pool):
+        self.host = host
+        self.port = port
+        self.pool = pool
+        self.lag = None  # seconds behind the primary, None if unknown/broken
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current_lag(self, interval):
+        if time.monotonic() - self.checked_at < interval:
+            return self.lag
+        # Only one thread refreshes; the others keep using the last reading
+        if not self._lock.acquire(blocking=False):
+            return self.lag
+        try:
+            self.lag = self._measure_lag()
+            self.checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+        return self.lag
+
+    def _measure_lag(self):
+        try:
+            with self.pool.acquire(timeout=0.5) as conn, conn.cursor(pymysql.cursors.DictCursor) as cur:
+                try:
+                    cur.execute("SHOW REPLICA STATUS")
+                except pymysql.err.MySQLError:
+                    cur.execute("SHOW SLAVE STATUS")
+                status = cur.fetchone()
+        except Exception as e:
+            print(f"Replica {self.host}:{self.port} unavailable: {e}")
+            return None
+        if not status:
+            return 0  # not replicating from anything, e.g. the primary itself
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        return None if lag is None else int(lag)
+
+
+def _replicas_from_env():
+    replicas = []
+    for entry in os.getenv('DB_REPLICA_HOSTS', '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.partition(':')
+        port = port or os.getenv('DB_PORT')
+        replicas.append(Replica(host, port, _pool_from_env(partial(_connect, host, port))))
+    return replicas
+
+
+_pool = None
+_replicas = None
+_replica_cursor = 0
+_pool_lock = threading.Lock()
+
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '2'))
+REPLICA_LAG_CHECK = float(os.getenv('DB_REPLICA_LAG_CHECK', '5'))
+# How long a client keeps reading from the primary after one of its own writes
+READ_AFTER_WRITE_WINDOW = float(os.getenv('DB_READ_AFTER_WRITE', '10'))
+
+
+def get_pool():
+    global _pool, _replicas
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _replicas = _replicas_from_env()
+                _pool = _pool_from_env()
+    return _pool
+
+
+def get_replicas():
+    get_pool()
+    return _replicas
+
+
+def _pick_replica():
+    """Round-robin over replicas that are within the allowed lag, or None."""
+    global _replica_cursor
+    replicas = get_replicas()
+    for _ in range(len(replicas)):
+        _replica_cursor = (_replica_cursor + 1) % len(replicas)
+        replica = replicas[_replica_cursor]
+        lag = replica.current_lag(REPLICA_LAG_CHECK)
+        if lag is not None and lag <= REPLICA_MAX_LAG:
+            return replica
+    return None
+
+
+def get_db_connection(readonly=False):
+    """Check out a pooled connection.
+
+    With ``readonly=True`` the connection comes from a healthy read replica
+    when one is configured, and from the primary otherwise.
+    """
+    pool = get_pool()
+    if readonly:
+        replica = _pick_replica()
+        if replica is not None:
+            try:
+                return replica.pool.acquire()
+            except Exception as e:
+                print(f"Replica {replica.host}:{replica.port} checkout failed, using primary: {e}")
+    return pool.acquire()
+
+
+def pool_stats():
+    return {
+        'primary': get_pool().stats(),
+        'replicas': [
+            dict(r.pool.stats(), host=r.host, port=r.port, lag=r.lag)
+            for r in get_replicas()
+        ],
+    }
+
+
+class _RequestConnection:
+    """The request's shared connection as seen by one ``with`` block.
+
+    Leaving the block keeps the connection checked out for the rest of the
+    request; an exception rolls back whatever the block left uncommitted,
+    just like closing a dedicated connection used to.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._conn.rollback()
+
+    def cursor(self, *args):
+        return instrument(self._conn.cursor(*args))
+
+    def commit(self):
+        self._conn.commit()
+        g._db_wrote = True
+
+    def close(self):
+        pass
+
+
+def read_replica(view):
+    """Mark a read-only view so its request connection may come from a replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._db_readonly = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _wrote_recently():
+    written_at = session.get('_db_write_at')
+    return written_at is not None and time.time() - written_at < READ_AFTER_WRITE_WINDOW
+
+
+def get_request_connection():
+    """Connection shared by everything running in the current app context.
+
+    Checked out lazily on first use and returned to the pool on teardown.
+    Views marked with ``read_replica`` get a replica connection unless this
+    client committed a write within the read-after-write window. Outside a
+    Flask context (scripts, background threads) this falls back to a plain
+    pooled checkout against the primary.
+    """
+    if not has_app_context():
+        return get_db_connection()
+    conn = g.get('_db_conn')
+    if conn is None:
+        readonly = g.get('_db_readonly', False) and not _wrote_recently()
+        conn = g._db_conn = get_db_connection(readonly=readonly)
+    return _RequestConnection(conn)
+
+
+def _stamp_write(response):
+    # Pin this client to the primary for a while so it reads its own writes
+    if g.get('_db_wrote'):
+        session['_db_write_at'] = time.time()
+    return response
+
+
+def release_request_connection(exc=None):
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.close()
+
+
+def init_app(app):
+    app.after_request(_stamp_write)
+    app.teardown_appcontext(release_request_connection)
 
 # def prepare_tables():
 #     connection = get_db_connection()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Maintenance of the event_summary table.
+
+event_summary holds one pre-aggregated row per event (venue label, genre,
+cheapest ticket, available/sold counts) so the listing pages can read
+upcoming events with a single range scan on start_time instead of
+aggregating every ticket row on every hit. The write paths in app.py keep
+it current through the helpers below; run this file to rebuild it from
+scratch (or with `compact` to fold in the counter shards).
+
+Ticket status changes do not update the summary row itself, which would
+make it a lock hotspot during an on-sale. They add their deltas to one of
+COUNTER_SHARDS rows of event_counter_shards, one per worker thread, so
+concurrent buyers of the same event rarely wait on each other. Readers add
+the shards to the summary row (see available()), and CounterCompactor
+periodically folds them back into event_summary.
+"""
+
+import os
+import random
+import sys
+import threading
+
+from db_connection import get_db_connection
+
+# Ticket statuses that have a counter column in event_summary
+STATUS_COLUMNS = {
+    'available': 'available_count',
+    'sold': 'sold_count',
+}
+
+COUNTER_SHARDS = int(os.getenv('EVENT_COUNTER_SHARDS', '16'))
+
+_local = threading.local()
+
+_UPSERT = """
+    INSERT INTO event_summary
+        (event_id, title, e_description, start_time, e_status, venue_name, city,
+         genre, image_path, min_price, available_count, sold_count)
+    SELECT
+        e.event_id, e.title, e.e_description, e.start_time, e.e_status, v.v_name, v.city,
+        ce.genre, e.image_path,
+        (SELECT MIN(t.face_value) FROM tickets t WHERE t.event_id = e.event_id),
+        (SELECT COUNT(*) FROM tickets t WHERE t.event_id = e.event_id AND t.ticket_status = 'available'),
+        (SELECT COUNT(*) FROM tickets t WHERE t.event_id = e.event_id AND t.ticket_status = 'sold')
+    FROM events e
+    JOIN venues v ON e.venue_id = v.venue_id
+    LEFT JOIN concert_events ce ON e.event_id = ce.event_id
+    {where}
+    ON DUPLICATE KEY UPDATE
+        title = VALUES(title), e_description = VALUES(e_description),
+        start_time = VALUES(start_time), e_status = VALUES(e_status),
+        venue_name = VALUES(venue_name), city = VALUES(city), genre = VALUES(genre),
+        image_path = VALUES(image_path){counts}
+"""
+
+_COUNTS = """,
+        min_price = VALUES(min_price), available_count = VALUES(available_count),
+        sold_count = VALUES(sold_count)"""
+
+
+def refresh_event(cur, event_id, counts=True):
+    """Re-read one event's details into its summary row.
+
+    With counts=False only the descriptive columns are refreshed, which is
+    all an event edit needs and avoids touching the event's tickets.
+    """
+    cur.execute(_UPSERT.format(where="WHERE e.event_id = %s", counts=_COUNTS if counts else ""),
+                (event_id,))
+    if counts:
+        # The recount already includes whatever the shards held
+        cur.execute("DELETE FROM event_counter_shards WHERE event_id = %s", (event_id,))
+
+
+def refresh_venue(cur, venue_id):
+    cur.execute("""
+        UPDATE event_summary es
+        JOIN events e ON es.event_id = e.event_id
+        JOIN venues v ON e.venue_id = v.venue_id
+        SET es.venue_name = v.v_name, es.city = v.city
+        WHERE e.venue_id = %s
+    """, (venue_id,))
+
+
+def ticket_added(cur, event_id, face_value, status):
+    cur.execute("UPDATE event_summary SET min_price = LEAST(COALESCE(min_price, %s), %s) WHERE event_id = %s",
+                (face_value, face_value, event_id))
+    tickets_changed(cur, event_id, None, status)
+
+
+def tickets_changed(cur, event_id, old_status, new_status, count=1):
+    """Move `count` tickets of an event from one status to another.
+
+    Either status may be None for a ticket that is being deleted or created.
+    The change goes to the calling thread's counter shard of the event.
+    """
+    deltas = _deltas(old_status, new_status, count)
+    if deltas:
+        cur.execute("""
+            INSERT INTO event_counter_shards (event_id, shard, available_count, sold_count)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE available_count = available_count + %s, sold_count = sold_count + %s
+        """, (event_id, _shard(), deltas['available_count'], deltas['sold_count'],
+              deltas['available_count'], deltas['sold_count']))
+
+
+def refresh_min_price(cur, event_id):
+    """Recompute the cheapest ticket after a price change or deletion."""
+    cur.execute("""
+        UPDATE event_summary
+        SET min_price = (SELECT MIN(face_value) FROM tickets WHERE event_id = %s)
+        WHERE event_id = %s
+    """, (event_id, event_id))
+
+
+def available(cur, event_id):
+    """Tickets of an event currently available, including uncompacted shards."""
+    cur.execute("""
+        SELECT es.available_count + COALESCE(SUM(c.available_count), 0)
+        FROM event_summary es
+        LEFT JOIN event_counter_shards c ON c.event_id = es.event_id
+        WHERE es.event_id = %s
+        GROUP BY es.event_id
+    """, (event_id,))
+    row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+def _shard():
+    # One shard per thread, so a transaction that changes several tickets
+    # locks a single shard row and cannot deadlock with another buyer
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = random.randrange(COUNTER_SHARDS)
+    return shard
+
+
+def _deltas(old_status, new_status, count):
+    if old_status == new_status:
+        return None
+    deltas = dict.fromkeys(STATUS_COLUMNS.values(), 0)
+    if old_status in STATUS_COLUMNS:
+        deltas[STATUS_COLUMNS[old_status]] -= int(count)
+    if new_status in STATUS_COLUMNS:
+        deltas[STATUS_COLUMNS[new_status]] += int(count)
+    return deltas if any(deltas.values()) else None
+
+
+def compact_event(cur, event_id):
+    """Fold one event's counter shards into its summary row; the caller commits."""
+    cur.execute("""
+        SELECT shard, available_count, sold_count FROM event_counter_shards
+        WHERE event_id = %s
+        FOR UPDATE
+    """, (event_id,))
+    shards = cur.fetchall()
+    if not shards:
+        return
+    cur.execute("""
+        UPDATE event_summary
+        SET available_count = available_count + %s, sold_count = sold_count + %s
+        WHERE event_id = %s
+    """, (sum(s[1] for s in shards), sum(s[2] for s in shards), event_id))
+    cur.execute(f"""
+        DELETE FROM event_counter_shards
+        WHERE event_id = %s AND shard IN ({','.join(['%s'] * len(shards))})
+    """, [event_id] + [s[0] for s in shards])
+
+
+class CounterCompactor(threading.Thread):
+    """Daemon thread that compacts the counter shards every `interval` seconds.
+
+    Each event is folded in its own transaction, so the shard rows of a
+    busy event are locked only for a moment.
+    """
+
+    def __init__(self, connect, interval=60):
+        super().__init__(name='counter-compactor', daemon=True)
+        self.connect = connect
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Counter compaction error: {e}")
+
+    def compact(self):
+        """Compact every event that has shards; returns how many there were."""
+        with self.connect() as conn, conn.cursor() as cur:
+            cur.execute("SELECT DISTINCT event_id FROM event_counter_shards")
+            event_ids = [row[0] for row in cur.fetchall()]
+            conn.commit()
+            for event_id in event_ids:
+                compact_event(cur, event_id)
+                conn.commit()
+        return len(event_ids)
+
+    def stop(self):
+        self._stopped.set()
+
+
+def rebuild(cur, shards=True):
+    """Recount every event. shards=False is for schemas that predate event_counter_shards."""
+    cur.execute("DELETE FROM event_summary")
+    if shards:
+        cur.execute("DELETE FROM event_counter_shards")
+    cur.execute(_UPSERT.format(where="WHERE TRUE", counts=_COUNTS))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['compact']:
+        print(f"Compacted counters of {CounterCompactor(get_db_connection).compact()} events")
+        sys.exit()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        rebuild(cur)
+        conn.commit()
+        cur.execute("SELECT COUNT(*) FROM event_summary")
+        print(f"event_summary rebuilt: {cur.fetchone()[0]} events")
@@ -0,0 +1,173 @@
+"""
+Prefix search over the tables behind the admin forms' pickers.
+
+Admin forms used to render every person, event, seat or ticket as an
+<option>; they now load options page by page from admin_lookup as the
+admin types (static/lookup.js). Each entity below names its label, the
+columns a query is matched against as a prefix (so the indexes on them
+apply), the parent filters it accepts (e.g. seats of an event's venue)
+and the column pages are keyed on. Rows are (id, label, sort value).
+
+Cursors are the JSON of the last row's [sort value, id].
+"""
+
+import json
+
+PAGE_SIZE = 20
+
+LOOKUPS = {
+    'persons': {
+        'sql': """
+            SELECT p.person_id, CONCAT(p.first_name, ' ', p.last_name, ' — ', COALESCE(p.email, 'no email')),
+                   p.last_name
+            FROM persons p
+        """,
+        'id': 'p.person_id',
+        'sort': 'p.last_name',
+        'search': ('p.last_name', 'p.first_name', 'p.email'),
+    },
+    'customers': {
+        'sql': """
+            SELECT p.person_id, CONCAT(p.first_name, ' ', p.last_name, ' — ', COALESCE(p.email, 'no email')),
+                   p.last_name
+            FROM customers c
+            JOIN persons p ON p.person_id = c.person_id
+        """,
+        'id': 'p.person_id',
+        'sort': 'p.last_name',
+        'search': ('p.last_name', 'p.first_name', 'p.email'),
+    },
+    'venues': {
+        'sql': """
+            SELECT v.venue_id, CONCAT(v.v_name, ' — ', COALESCE(v.city, ''), ', ', COALESCE(v.country, '')),
+                   v.v_name
+            FROM venues v
+        """,
+        'id': 'v.venue_id',
+        'sort': 'v.v_name',
+        'search': ('v.v_name',),
+    },
+    'events': {
+        'sql': """
+            SELECT e.event_id, CONCAT(e.title, ' — ', DATE_FORMAT(e.start_time, '%%Y-%%m-%%d %%H:%%i')),
+                   e.start_time
+            FROM events e
+        """,
+        'id': 'e.event_id',
+        'sort': 'e.start_time',
+        'descending': True,
+        'search': ('e.title',),
+        'numeric': True,
+    },
+    'seats': {
+        'sql': """
+            SELECT s.seat_id,
+                   CONCAT(COALESCE(s.seat_section, ''), '-', COALESCE(s.row_label, ''), '-',
+                          COALESCE(s.seat_number, ''), ' @ ', v.v_name),
+                   NULL
+            FROM seats s
+            JOIN venues v ON v.venue_id = s.venue_id
+        """,
+        'id': 's.seat_id',
+        'search': ('s.seat_section',),
+        'parents': {
+            'venue_id': "s.venue_id = %s",
+            'event_id': "s.venue_id = (SELECT venue_id FROM events WHERE event_id = %s)",
+        },
+    },
+    'tickets': {
+        'sql': """
+            SELECT t.ticket_id,
+                   CONCAT('#', t.ticket_id, ' — ', e.title, ' — ',
+                          COALESCE(CONCAT(s.seat_section, '-', s.row_label, '-', s.seat_number), 'GENERAL'),
+                          ' — €', t.face_value, ' (', t.ticket_status, ')'),
+                   NULL
+            FROM tickets t
+            JOIN events e ON e.event_id = t.event_id
+            LEFT JOIN seats s ON s.seat_id = t.seat_id
+        """,
+        'id': 't.ticket_id',
+        'descending': True,
+        'search': ('e.title',),
+        'numeric': True,
+        'parents': {'event_id': "t.event_id = %s"},
+        'flags': {'unsold': "NOT EXISTS (SELECT 1 FROM purchase_items pi WHERE pi.ticket_id = t.ticket_id)"},
+    },
+    'purchases': {
+        'sql': """
+            SELECT pur.purchase_id,
+                   CONCAT('#', pur.purchase_id, ' — ', p.first_name, ' ', p.last_name, ' — ',
+                          COALESCE(DATE_FORMAT(pur.purchase_time, '%%Y-%%m-%%d %%H:%%i'), 'no date'),
+                          ' — €', pur.total_amount, ' (', pur.purch_status, ')'),
+                   NULL
+            FROM purchases pur
+            JOIN persons p ON p.person_id = pur.customer_id
+        """,
+        'id': 'pur.purchase_id',
+        'descending': True,
+        'search': ('p.last_name',),
+        'numeric': True,
+    },
+}
+
+
+def _prefix(query):
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+def decode_cursor(cursor):
+    """[sort value, id] from a cursor, or None if it is malformed."""
+    try:
+        after = json.loads(cursor)
+        if isinstance(after, list) and len(after) == 2 and isinstance(after[1], int):
+            return after
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def lookup(cur, entity, query='', parents=None, flags=(), after=None, limit=PAGE_SIZE):
+    """One page of (id, label) options matching `query` and the cursor of the next page.
+
+    `parents` maps parent names to ids (unknown ones are ignored), `flags`
+    names extra filters and `after` is a decoded cursor.
+    """
+    spec = LOOKUPS[entity]
+    sort = spec.get('sort')
+    where, params = [], []
+    for name, value in (parents or {}).items():
+        if name in spec.get('parents', {}):
+            where.append(spec['parents'][name])
+            params.append(value)
+    for flag in flags:
+        if flag in spec.get('flags', {}):
+            where.append(spec['flags'][flag])
+    if query:
+        terms = [f"{column} LIKE %s" for column in spec['search']]
+        params += [_prefix(query)] * len(terms)
+        if spec.get('numeric') and query.isdigit():
+            terms.append(f"{spec['id']} = %s")
+            params.append(int(query))
+        where.append(f"({' OR '.join(terms)})")
+    op, direction = ('<', 'DESC') if spec.get('descending') else ('>', 'ASC')
+    if after:
+        if sort:
+            where.append(f"({sort} {op} %s OR ({sort} = %s AND {spec['id']} {op} %s))")
+            params += [after[0], after[0], after[1]]
+        else:
+            where.append(f"{spec['id']} {op} %s")
+            params.append(after[1])
+    order = [f"{sort} {direction}"] if sort else []
+    order.append(f"{spec['id']} {direction}")
+    cur.execute(f"""
+        {spec['sql']}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {', '.join(order)}
+        LIMIT %s
+    """, params + [limit + 1])
+    rows = cur.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = json.dumps([rows[-1][2], rows[-1][0]], default=str) if more else None
+    return [(row[0], row[1]) for row in rows], next_cursor
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for databases created from an older database.sql.
+
+database.sql always describes the current schema for fresh installs; every
+change to it is also added here as a numbered migration, so existing
+databases can be brought up to date with
+
+    python migrations.py migrate     # apply pending migrations
+    python migrations.py status      # list applied and pending versions
+    python migrations.py explain     # EXPLAIN the application's statements and queries.sql
+
+Applied versions are recorded in schema_migrations. Every step checks
+information_schema before changing anything, so running a migration against
+a database that already has the change (e.g. one loaded from the current
+database.sql) only records the version.
+
+`explain` needs a seeded database (database.sql + sample_data.sql); on
+near-empty tables the optimizer prefers full scans whatever the indexes.
+"""
+
+import ast
+import re
+import sys
+
+import lookups
+from db_connection import get_db_connection
+
+# Every module that sends SQL to MySQL on behalf of the site
+SQL_MODULES = ('app.py', 'event_summary.py', 'search_backends.py', 'search_index.py', 'seatmap.py',
+               'ticket_claims.py', 'cart_store.py', 'purchase_history.py', 'lookups.py')
+QUERIES_FILE = 'queries.sql'
+
+
+def _index_exists(cur, table, index):
+    cur.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, index))
+    return cur.fetchone() is not None
+
+
+def _column_exists(cur, table, column):
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cur.fetchone() is not None
+
+
+def create_index(cur, table, index, columns, kind=''):
+    if not _index_exists(cur, table, index):
+        cur.execute(f"CREATE {kind + ' ' if kind else ''}INDEX {index} ON {table}({columns})")
+
+
+def drop_index(cur, table, index):
+    if _index_exists(cur, table, index):
+        cur.execute(f"DROP INDEX {index} ON {table}")
+
+
+def add_column(cur, table, column, definition):
+    if not _column_exists(cur, table, column):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _001_event_summary(cur):
+    import event_summary
+    cur.execute("SHOW TABLES LIKE 'event_summary'")
+    created = cur.fetchone() is None
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS event_summary (
+            event_id          INT PRIMARY KEY,
+            title             VARCHAR(255) NOT NULL,
+            e_description     TEXT,
+            start_time        DATETIME NOT NULL,
+            e_status          VARCHAR(20) NOT NULL,
+            venue_name        VARCHAR(200),
+            city              VARCHAR(100),
+            genre             VARCHAR(100),
+            image_path        VARCHAR(255),
+            min_price         DECIMAL(10,2) NULL,
+            available_count   INT NOT NULL DEFAULT 0,
+            sold_count        INT NOT NULL DEFAULT 0,
+            updated_at        DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            CONSTRAINT fk_event_summary_event FOREIGN KEY (event_id) REFERENCES events(event_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """)
+    create_index(cur, 'event_summary', 'idx_event_summary_status_start', 'e_status, start_time')
+    create_index(cur, 'event_summary', 'idx_event_summary_genre_start', 'genre, e_status, start_time')
+    if created:
+        # event_counter_shards only exists from migration 008 on
+        event_summary.rebuild(cur, shards=False)
+
+
+def _002_featured_events(cur):
+    add_column(cur, 'events', 'is_featured', "TINYINT(1) NOT NULL DEFAULT 0 AFTER image_path")
+    add_column(cur, 'events', 'featured_priority', "INT NOT NULL DEFAULT 0 AFTER is_featured")
+    add_column(cur, 'events', 'featured_from', "DATETIME NULL AFTER featured_priority")
+    add_column(cur, 'events', 'featured_until', "DATETIME NULL AFTER featured_from")
+    create_index(cur, 'events', 'idx_events_featured',
+                 'is_featured, e_status, featured_priority DESC, start_time')
+    # Keep featuring The Weeknd, which the home page used to pick by title
+    cur.execute("UPDATE events SET is_featured = 1 WHERE title LIKE %s", ('%Weeknd%',))
+
+
+def _003_fulltext_search(cur):
+    create_index(cur, 'events', 'ft_events_title_description', 'title, e_description', 'FULLTEXT')
+    create_index(cur, 'venues', 'ft_venues_name', 'v_name', 'FULLTEXT')
+    create_index(cur, 'artists', 'ft_artists_stage_name', 'stage_name', 'FULLTEXT')
+
+
+def _004_composite_indexes(cur):
+    # Upcoming-event filters: e_status equality first, then the start_time range
+    create_index(cur, 'events', 'idx_events_status_start', 'e_status, start_time')
+    # Per-event availability and cheapest ticket without touching the rows;
+    # uq_event_seat still serves the event_id foreign key
+    create_index(cur, 'tickets', 'idx_tickets_event_status_price', 'event_id, ticket_status, face_value')
+    drop_index(cur, 'tickets', 'idx_tickets_event')
+    # Genre list and genre pages (InnoDB appends event_id to every secondary index)
+    create_index(cur, 'concert_events', 'idx_concert_events_genre', 'genre')
+    # Purchase history newest first
+    create_index(cur, 'purchases', 'idx_purchases_customer_time', 'customer_id, purchase_time')
+    # Revenue reports over a paid_at window, covering the joined and summed columns
+    create_index(cur, 'payments', 'idx_payments_paid_at', 'paid_at, purchase_id, amount')
+
+
+def _005_ticket_holds(cur):
+    add_column(cur, 'tickets', 'hold_expires_at', "DATETIME NULL AFTER ticket_status")
+    add_column(cur, 'tickets', 'held_by', "INT NULL AFTER hold_expires_at")
+    # The hold sweeper's scan for expired reservations
+    create_index(cur, 'tickets', 'idx_tickets_status_hold', 'ticket_status, hold_expires_at')
+
+
+def _006_seat_quality(cur):
+    # Per-venue seat ranking for best-available allocation (higher is better)
+    add_column(cur, 'seats', 'quality', "SMALLINT NULL AFTER is_accessible")
+
+
+def _007_purchase_requests(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS purchase_requests (
+            idempotency_key  VARCHAR(64) PRIMARY KEY,
+            person_id        INT NOT NULL,
+            purchase_id      INT NULL,
+            created_at       DATETIME DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT fk_purchase_requests_purchase FOREIGN KEY (purchase_id) REFERENCES purchases(purchase_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """)
+
+
+def _008_event_counter_shards(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS event_counter_shards (
+            event_id          INT NOT NULL,
+            shard             SMALLINT NOT NULL,
+            available_count   INT NOT NULL DEFAULT 0,
+            sold_count        INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (event_id, shard),
+            CONSTRAINT fk_event_counter_shards_event FOREIGN KEY (event_id) REFERENCES events(event_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """)
+
+
+def _009_lookup_indexes(cur):
+    # Prefix searches of the admin pickers (lookups.py); emails are already unique
+    create_index(cur, 'persons', 'idx_persons_last_first', 'last_name, first_name')
+    create_index(cur, 'persons', 'idx_persons_first', 'first_name')
+    create_index(cur, 'venues', 'idx_venues_name', 'v_name')
+    create_index(cur, 'events', 'idx_events_title', 'title')
+
+
+MIGRATIONS = [
+    (1, 'event_summary table', _001_event_summary),
+    (2, 'featured event columns', _002_featured_events),
+    (3, 'FULLTEXT search indexes', _003_fulltext_search),
+    (4, 'composite and covering indexes', _004_composite_indexes),
+    (5, 'ticket holds', _005_ticket_holds),
+    (6, 'seat quality', _006_seat_quality),
+    (7, 'purchase idempotency keys', _007_purchase_requests),
+    (8, 'sharded event counters', _008_event_counter_shards),
+    (9, 'admin lookup indexes', _009_lookup_indexes),
+]
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     INT PRIMARY KEY,
+            name        VARCHAR(255) NOT NULL,
+            applied_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def migrate():
+    with get_db_connection() as conn, conn.cursor() as cur:
+        done = applied_versions(cur)
+        pending = [m for m in MIGRATIONS if m[0] not in done]
+        if not pending:
+            print("Schema is up to date.")
+        for version, name, step in pending:
+            # DDL commits implicitly in MySQL, which is why every step is idempotent
+            step(cur)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            print(f"Applied {version:03d} {name}")
+
+
+def status():
+    with get_db_connection() as conn, conn.cursor() as cur:
+        done = applied_versions(cur)
+    for version, name, _ in MIGRATIONS:
+        print(f"{version:03d} {'applied' if version in done else 'pending':8} {name}")
+
+
+def _sql_text(node, strings):
+    """Source of a SQL argument, with the parts only known at run time as %s.
+
+    Handles string and f-string literals, names assigned one of those in
+    the module (`strings`) and `.format()` calls on either. An optional
+    clause like {'AND x = %s' if x else ''} is kept.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        return ''.join(_sql_text(part, strings) or '%s' for part in node.values)
+    if isinstance(node, ast.FormattedValue):
+        return _sql_text(node.value, strings)
+    if isinstance(node, ast.IfExp):
+        return _sql_text(node.body, strings)
+    if isinstance(node, ast.Name) and node.id in strings:
+        return _sql_text(strings[node.id], strings)
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr == 'format'):
+        template = _sql_text(node.func.value, strings)
+        return re.sub(r'\{\w*\}', '%s', template) if template else None
+    return None
+
+
+def module_statements(path):
+    """(location, sql) for every SELECT/UPDATE/DELETE passed to execute() in one module."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    strings = {node.targets[0].id: node.value for node in ast.walk(tree)
+               if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name)
+               and isinstance(node.value, (ast.Constant, ast.JoinedStr))}
+    statements = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr == 'execute' and node.args):
+            sql = _sql_text(node.args[0], strings)
+            if sql and sql.split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+                statements.append((f"{path}:{node.lineno}", sql))
+    return sorted(statements, key=lambda s: int(s[0].rsplit(':', 1)[1]))
+
+
+def lookup_statements():
+    """(location, sql) of each admin lookup, searched and paged, as lookups.lookup builds it.
+
+    Their SQL is assembled from LOOKUPS at run time, so it is recorded
+    from a call rather than read from the source.
+    """
+    statements = []
+
+    class Recorder:
+        def execute(self, sql, params=None):
+            statements.append((f"lookups.py:{entity}", sql))
+
+        def fetchall(self):
+            return []
+
+    for entity, spec in lookups.LOOKUPS.items():
+        lookups.lookup(Recorder(), entity, 'a', parents=dict.fromkeys(spec.get('parents', {}), 1),
+                       flags=spec.get('flags', {}).keys(), after=['a', 1])
+    return statements
+
+
+def application_statements():
+    statements = []
+    for path in SQL_MODULES:
+        statements += module_statements(path)
+    return statements + lookup_statements()
+
+
+def report_statements(path=QUERIES_FILE):
+    with open(path) as f:
+        text = re.sub(r'/\*.*?\*/', '', f.read(), flags=re.S)
+    text = '\n'.join(line for line in text.splitlines() if not line.strip().startswith('--'))
+    return [(f"{path}#{i}", sql.strip())
+            for i, sql in enumerate((s for s in text.split(';') if s.strip()), 1)]
+
+
+def _bind_placeholders(sql):
+    """Replace DB-API placeholders with literals EXPLAIN accepts.
+
+    Strings compare against both string and integer columns without
+    defeating the index, except where MySQL requires a number (LIMIT).
+    """
+    sql = re.sub(r'\b(LIMIT|OFFSET)\s+%s', r'\1 10', sql, flags=re.I)
+    sql = re.sub(r'\bIN\s+%s', "IN ('1')", sql, flags=re.I)
+    return sql.replace('%s', "'1'").replace('%%', '%')
+
+
+def explain(statements):
+    """EXPLAIN each statement and print the ones that scan whole tables or sort on disk.
+
+    Returns the number of flagged statements.
+    """
+    flagged = 0
+    with get_db_connection() as conn, conn.cursor() as cur:
+        for location, sql in statements:
+            try:
+                cur.execute("EXPLAIN " + _bind_placeholders(sql))
+            except Exception as e:
+                print(f"{location}: EXPLAIN failed: {e}")
+                continue
+            columns = [d[0] for d in cur.description]
+            problems = []
+            for row in cur.fetchall():
+                plan = dict(zip(columns, row))
+                extra = plan.get('Extra') or ''
+                if plan.get('type') == 'ALL':
+                    problems.append(f"full scan of {plan['table']} (~{plan.get('rows')} rows)")
+                if 'Using filesort' in extra:
+                    problems.append(f"filesort on {plan['table']}")
+            if problems:
+                flagged += 1
+                first_line = ' '.join(sql.split())[:80]
+                print(f"{location}: {'; '.join(problems)}\n    {first_line}")
+        conn.rollback()
+    print(f"{flagged} of {len(statements)} statements do full scans or filesorts")
+    return flagged
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    if command == 'migrate':
+        migrate()
+    elif command == 'status':
+        status()
+    elif command == 'explain':
+        explain(application_statements() + report_statements())
+    else:
+        print(f"Usage: {sys.argv[0]} [migrate|status|explain]")
+        sys.exit(2)
@@ -0,0 +1,88 @@
+"""
+Password hashing off the request threads.
+
+bcrypt is deliberately slow, so a burst of logins used to keep every
+worker thread busy hashing while catalog pages queued behind them. A
+PasswordHasher runs bcrypt on a small pool of its own threads (bcrypt
+releases the GIL, so they use separate cores while request threads only
+wait) and refuses new work once `max_pending` operations are queued,
+raising PasswordsBusy so the page can ask the user to retry.
+
+Unless pinned, the cost factor is calibrated at startup to the highest
+one whose hash takes at most `target_ms` on this machine, but never below
+DEFAULT_ROUNDS (Flask-Bcrypt's default, which existing hashes use), so a
+slow or busy machine cannot weaken them. Stored hashes with a lower cost
+are upgraded on the next successful login (needs_rehash); higher ones are
+left alone, so workers that calibrate differently do not undo each other.
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+DEFAULT_ROUNDS = 12
+
+
+class PasswordsBusy(Exception):
+    """Too many password operations are already queued or running."""
+
+
+def calibrate_rounds(target_ms, min_rounds=DEFAULT_ROUNDS, max_rounds=15):
+    """Highest bcrypt cost whose hash takes at most target_ms here.
+
+    Every extra round doubles the work, so one hash at min_rounds is
+    enough to extrapolate from.
+    """
+    began = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(min_rounds))
+    elapsed_ms = (time.perf_counter() - began) * 1000
+    extra = int(math.log2(target_ms / elapsed_ms)) if target_ms > elapsed_ms else 0
+    return max(min_rounds, min(max_rounds, min_rounds + extra))
+
+
+def hash_rounds(hashed):
+    """Cost factor of a stored hash such as '$2b$12$...', or None if unreadable."""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, rounds=None, target_ms=250, workers=1, max_pending=32, timeout=10):
+        self.rounds = rounds or calibrate_rounds(target_ms)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordsBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot stays taken until the hash finishes, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordsBusy()
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password, hashed):
+        try:
+            return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+        except ValueError:  # not a bcrypt hash
+            return False
+
+    def needs_rehash(self, hashed):
+        rounds = hash_rounds(hashed)
+        return rounds is not None and rounds < self.rounds
@@ -0,0 +1,111 @@
+"""
+Purchase history for the profile page, one page at a time.
+
+Pages are keyed on (purchase_time, purchase_id), newest first: the next
+page starts below the last row shown, so reading page 20 costs the same
+index range scan on idx_purchases_customer_time as page 1 (InnoDB appends
+purchase_id to the index). Purchases without a time sort last, as MySQL
+puts NULLs last in descending order. Cursors travel as opaque strings like
+'20240501120000.1234', or '.1234' once the undated purchases are reached.
+
+The page is cut in the subquery and the rest is LEFT JOINed, so a purchase
+without items still shows up and the extra row that signals another page
+is never lost to the joins.
+
+Rows are positional like the rest of the templates:
+
+    (purchase_id, purchase_time, total_amount, purch_status,
+     title, start_time, venue_name, ticket_count)
+"""
+
+from datetime import datetime
+
+PAGE_SIZE = 20
+
+PAGE_QUERY = """
+    SELECT
+        pur.purchase_id,
+        pur.purchase_time,
+        pur.total_amount,
+        pur.purch_status,
+        e.title,
+        e.start_time,
+        v.v_name,
+        COUNT(pi.ticket_id) as ticket_count
+    FROM (
+        SELECT purchase_id, purchase_time, total_amount, purch_status
+        FROM purchases
+        WHERE customer_id = %s {after}
+        ORDER BY purchase_time DESC, purchase_id DESC
+        LIMIT %s
+    ) pur
+    LEFT JOIN purchase_items pi ON pur.purchase_id = pi.purchase_id
+    LEFT JOIN tickets t ON pi.ticket_id = t.ticket_id
+    LEFT JOIN events e ON t.event_id = e.event_id
+    LEFT JOIN venues v ON e.venue_id = v.venue_id
+    GROUP BY pur.purchase_id
+    ORDER BY pur.purchase_time DESC, pur.purchase_id DESC
+"""
+
+_AFTER = "AND (purchase_time < %s OR (purchase_time = %s AND purchase_id < %s) OR purchase_time IS NULL)"
+_AFTER_UNDATED = "AND purchase_time IS NULL AND purchase_id < %s"
+
+SUMMARY_QUERY = """
+    SELECT
+        COUNT(*),
+        COALESCE(SUM(pur.purch_status = 'completed'), 0),
+        COALESCE(SUM(CASE WHEN pur.purch_status = 'completed' THEN pur.total_amount END), 0),
+        (SELECT COUNT(*) FROM purchase_items pi
+         JOIN purchases p ON pi.purchase_id = p.purchase_id
+         WHERE p.customer_id = %s AND p.purch_status = 'completed'),
+        (SELECT loyalty_points FROM customers WHERE person_id = %s)
+    FROM purchases pur
+    WHERE pur.customer_id = %s
+"""
+
+
+def encode_cursor(row):
+    stamp = f"{row[1]:%Y%m%d%H%M%S}" if row[1] else ''
+    return f"{stamp}.{row[0]}"
+
+
+def decode_cursor(cursor):
+    """(purchase_time or None, purchase_id) from a cursor, or None if it is malformed."""
+    try:
+        stamp, purchase_id = cursor.split('.')
+        return (datetime.strptime(stamp, '%Y%m%d%H%M%S') if stamp else None), int(purchase_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def history_page(cur, customer_id, cursor=None, limit=PAGE_SIZE):
+    """One page of purchases below `cursor` and the cursor of the next page (None at the end)."""
+    after = decode_cursor(cursor) if cursor else None
+    params = [customer_id]
+    if after and after[0] is None:
+        condition = _AFTER_UNDATED
+        params.append(after[1])
+    elif after:
+        condition = _AFTER
+        params += [after[0], after[0], after[1]]
+    else:
+        condition = ""
+    # One extra row tells whether another page follows
+    cur.execute(PAGE_QUERY.format(after=condition), params + [limit + 1])
+    rows = cur.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (encode_cursor(rows[-1]) if more and rows else None)
+
+
+def customer_summary(cur, customer_id):
+    """Orders, completed orders, lifetime spend, tickets bought and loyalty points."""
+    cur.execute(SUMMARY_QUERY, (customer_id, customer_id, customer_id))
+    orders, completed, spent, tickets, points = cur.fetchone()
+    return {
+        'orders': int(orders),
+        'completed_orders': int(completed),
+        'lifetime_spend': spent,
+        'tickets': int(tickets),
+        'loyalty_points': points or 0,
+    }
@@ -0,0 +1,123 @@
+import logging
+import os
+import re
+import time
+from flask import g, has_request_context, request
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+# Same normalized statement this many times in one request is reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '3'))
+
+slow_log = logging.getLogger('ticketmeister.sql')
+if not slow_log.handlers:
+    _handler = (logging.FileHandler(os.getenv('SLOW_QUERY_LOG'))
+                if os.getenv('SLOW_QUERY_LOG') else logging.StreamHandler())
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    slow_log.addHandler(_handler)
+    slow_log.setLevel(logging.INFO)
+    slow_log.propagate = False
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape: literals become ?, IN lists collapse."""
+    sql = _STRING.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class QueryStats:
+    """Statements executed during one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.rows = 0
+        self.repeats = {}
+        self.flagged = set()
+
+    def record(self, sql, elapsed_ms, rows):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.rows += max(rows, 0)
+        shape = normalize_sql(sql)
+        seen = self.repeats.get(shape, 0) + 1
+        self.repeats[shape] = seen
+
+        where = f"{request.method} {request.path}" if has_request_context() else '-'
+        if elapsed_ms >= SLOW_QUERY_MS:
+            slow_log.warning("slow query %.1fms rows=%d %s: %s", elapsed_ms, rows, where, shape)
+        if seen >= N_PLUS_ONE_THRESHOLD and shape not in self.flagged:
+            self.flagged.add(shape)
+            slow_log.warning("possible N+1: statement repeated %d times in %s: %s", seen, where, shape)
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times each statement into the request's QueryStats."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def execute(self, query, args=None):
+        return self._timed(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(self._cursor.executemany, query, args)
+
+    def _timed(self, run, query, args):
+        start = time.perf_counter()
+        try:
+            result = run(query, args)
+        except Exception as e:
+            slow_log.error("query failed after %.1fms: %s (%s)",
+                           (time.perf_counter() - start) * 1000, normalize_sql(query), e)
+            raise
+        self._stats.record(query, (time.perf_counter() - start) * 1000, self._cursor.rowcount)
+        return result
+
+
+def current_stats():
+    stats = g.get('_query_stats')
+    if stats is None:
+        stats = g._query_stats = QueryStats()
+    return stats
+
+
+def instrument(cursor):
+    """Wrap a cursor so its statements count towards the current request."""
+    if not has_request_context():
+        return cursor
+    return InstrumentedCursor(cursor, current_stats())
+
+
+def _server_timing(response):
+    stats = g.get('_query_stats')
+    if stats is not None:
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries, {stats.rows} rows"',
+        )
+    return response
+
+
+def init_app(app):
+    app.after_request(_server_timing)
@@ -0,0 +1,126 @@
+"""
+Token-bucket rate limiting for expensive routes.
+
+Every client gets a bucket per route that holds up to `burst` tokens and
+refills at `rate` tokens per second; a request takes one token or is
+answered with 429 and a Retry-After header straight away, before the view
+runs, so rejections never reach the database or bcrypt.
+
+Clients are keyed by the logged-in user id from the session (without
+loading the user) and otherwise by remote address, which is the proxy's
+address unless the app runs behind ProxyFix. Buckets live in process
+memory, or in Redis when CACHE_URL is set so all workers share one budget.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session
+
+# Atomically refill and take a token; returns 0 or the milliseconds to wait
+_TAKE_SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait
+"""
+
+
+class LocalBuckets:
+    """Token buckets in process memory, least recently used dropped beyond maxsize."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> [tokens, updated]
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take a token; returns 0, or the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker through Redis."""
+
+    def __init__(self, url, prefix='tm:rate:'):
+        import redis  # optional dependency, only needed when CACHE_URL is set
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, rate, burst):
+        now_ms = int(time.time() * 1000)
+        return int(self._take(keys=[self.prefix + key], args=[rate, burst, now_ms])) / 1000
+
+
+def make_buckets(maxsize=100000):
+    """Bucket store chosen by CACHE_URL: Redis when set, process-local otherwise."""
+    url = os.getenv('CACHE_URL')
+    if url:
+        try:
+            return RedisBuckets(url)
+        except ImportError:
+            print("CACHE_URL is set but the redis package is not installed; using local rate limits")
+    return LocalBuckets(maxsize)
+
+
+def budget(value):
+    """Parse a 'rate:burst' budget, e.g. '0.1:5' for a burst of 5, then one every 10 s."""
+    rate, burst = value.split(':')
+    return float(rate), int(burst)
+
+
+def client_key():
+    user_id = session.get('_user_id')
+    return f"u{user_id}" if user_id else request.remote_addr or '-'
+
+
+class RateLimiter:
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def limit(self, name, rate, burst, methods=None):
+        """Decorator allowing each client `burst` requests at once, then `rate` per second.
+
+        With methods, only requests using those methods count (e.g. only
+        the POST of a login form). A rate of 0 turns the limit off.
+        """
+        def decorator(view):
+            @wraps(view)
+            def limited(*args, **kwargs):
+                if rate > 0 and (methods is None or request.method in methods):
+                    wait = self.buckets.take(f"{name}:{client_key()}", rate, burst)
+                    if wait:
+                        return ("Too many requests, please slow down.", 429,
+                                {'Retry-After': str(math.ceil(wait)), 'Content-Type': 'text/plain'})
+                return view(*args, **kwargs)
+            return limited
+        return decorator
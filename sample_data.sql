@@ -195,4 +195,22 @@ INSERT INTO event_organizers (event_organizer_id, event_id, person_id, person_ro
 (3, 3, 7, 'Logistics', '2025-08-03 09:25:00'),
 (4, 6, 8, 'Coordinator', '2025-08-04 09:30:00');
 
+UPDATE events SET is_featured = 1 WHERE event_id = 2;
+
+-- ---------------------------
+-- EVENT_SUMMARY (derived; same as `python event_summary.py`)
+-- ---------------------------
+INSERT INTO event_summary
+    (event_id, title, e_description, start_time, e_status, venue_name, city,
+     genre, image_path, min_price, available_count, sold_count)
+SELECT
+    e.event_id, e.title, e.e_description, e.start_time, e.e_status, v.v_name, v.city,
+    ce.genre, e.image_path,
+    (SELECT MIN(t.face_value) FROM tickets t WHERE t.event_id = e.event_id),
+    (SELECT COUNT(*) FROM tickets t WHERE t.event_id = e.event_id AND t.ticket_status = 'available'),
+    (SELECT COUNT(*) FROM tickets t WHERE t.event_id = e.event_id AND t.ticket_status = 'sold')
+FROM events e
+JOIN venues v ON e.venue_id = v.venue_id
+LEFT JOIN concert_events ce ON e.event_id = ce.event_id;
+
 SET FOREIGN_KEY_CHECKS = 1;
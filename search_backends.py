@@ -0,0 +1,105 @@
+"""
+SQL search backends for /search, selectable with SEARCH_BACKEND.
+
+Each backend returns rows of
+(event_id, title, start_time, venue_name, city, genre, min_price)
+for upcoming scheduled events, so they can be compared side by side with
+the in-memory index.
+"""
+
+import re
+
+FULLTEXT_MODES = {
+    'natural': 'IN NATURAL LANGUAGE MODE',
+    'boolean': 'IN BOOLEAN MODE',
+}
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def like_search(cur, query, limit=10):
+    """The original substring search over title, venue name and genre."""
+    pattern = f'%{query}%'
+    cur.execute("""
+        SELECT
+            e.event_id,
+            e.title,
+            e.start_time,
+            v.v_name,
+            v.city,
+            ce.genre,
+            MIN(t.face_value) as min_price
+        FROM events e
+        JOIN venues v ON e.venue_id = v.venue_id
+        LEFT JOIN concert_events ce ON e.event_id = ce.event_id
+        LEFT JOIN tickets t ON e.event_id = t.event_id
+        WHERE (e.title LIKE %s OR v.v_name LIKE %s OR ce.genre LIKE %s)
+            AND e.start_time > NOW()
+            AND e.e_status = 'scheduled'
+        GROUP BY e.event_id
+        ORDER BY e.start_time ASC
+        LIMIT %s
+    """, (pattern, pattern, pattern, limit))
+    return cur.fetchall()
+
+
+def boolean_query(query):
+    """Turn typeahead input into a boolean-mode query: every word required, last one as prefix.
+
+    User input never reaches MySQL's operator syntax; only word characters survive.
+    """
+    words = _WORD.findall(query)
+    if not words:
+        return ''
+    # Whole words below InnoDB's default ft_min_token_size (3) are never indexed
+    terms = [f'+{word}' for word in words[:-1] if len(word) >= 3] + [f'+{words[-1]}*']
+    return ' '.join(terms)
+
+
+def fulltext_search(cur, query, limit=10, mode='boolean'):
+    """Relevance-ranked search on the FULLTEXT indexes of events, venues and artists.
+
+    Matches on the event title/description, the venue name and the stage
+    names of performers are scored separately, summed per event and ranked
+    by relevance, then by date.
+    """
+    if mode == 'boolean':
+        query = boolean_query(query)
+        if not query:
+            return []
+    against = f"AGAINST (%s {FULLTEXT_MODES[mode]})"
+    cur.execute(f"""
+        SELECT
+            e.event_id,
+            e.title,
+            e.start_time,
+            v.v_name,
+            v.city,
+            ce.genre,
+            es.min_price,
+            SUM(m.score) AS relevance
+        FROM (
+            SELECT event_id, MATCH(title, e_description) {against} AS score
+            FROM events
+            WHERE MATCH(title, e_description) {against}
+            UNION ALL
+            SELECT ev.event_id, MATCH(ven.v_name) {against}
+            FROM venues ven
+            JOIN events ev ON ev.venue_id = ven.venue_id
+            WHERE MATCH(ven.v_name) {against}
+            UNION ALL
+            SELECT perf.event_id, MATCH(a.stage_name) {against}
+            FROM artists a
+            JOIN performances perf ON perf.artist_id = a.person_id
+            WHERE MATCH(a.stage_name) {against}
+        ) m
+        JOIN events e ON e.event_id = m.event_id
+        JOIN venues v ON e.venue_id = v.venue_id
+        LEFT JOIN concert_events ce ON e.event_id = ce.event_id
+        LEFT JOIN event_summary es ON e.event_id = es.event_id
+        WHERE e.e_status = 'scheduled' AND e.start_time > NOW()
+        GROUP BY e.event_id
+        ORDER BY relevance DESC, e.start_time ASC
+        LIMIT %s
+    """, (query,) * 6 + (limit,))
+    return [row[:7] for row in cur.fetchall()]
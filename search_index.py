@@ -0,0 +1,140 @@
+import threading
+import time
+from datetime import datetime
+
+_EVENTS_SQL = """
+    SELECT e.event_id, e.venue_id, e.title, e.start_time, v.v_name, v.city, ce.genre
+    FROM events e
+    JOIN venues v ON e.venue_id = v.venue_id
+    LEFT JOIN concert_events ce ON e.event_id = ce.event_id
+    WHERE e.e_status = 'scheduled' AND e.start_time > NOW() {where}
+"""
+
+_PERFORMERS_SQL = """
+    SELECT perf.event_id, a.stage_name
+    FROM performances perf
+    JOIN artists a ON perf.artist_id = a.person_id
+    JOIN events e ON perf.event_id = e.event_id
+    WHERE e.e_status = 'scheduled' AND e.start_time > NOW()
+        AND a.stage_name IS NOT NULL {where}
+"""
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SearchIndex:
+    """In-memory n-gram index over upcoming events for the search typeahead.
+
+    Every searchable field (title, venue, city, genre, performer stage names)
+    is lower-cased and split into 2- and 3-grams. A query intersects the
+    postings of its own grams and then confirms the substring match, so it
+    gives the same hits as LIKE '%q%' without scanning anything.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age  # full rebuild interval, picks up other workers' writes
+        self.loaded_at = None
+        self._docs = {}  # event_id -> dict
+        self._postings = {}  # gram -> set of event_ids
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def is_stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.max_age
+
+    def load_if_stale(self, connect):
+        """Build or rebuild the index with a connection from `connect` when due.
+
+        The first build blocks concurrent searches; later rebuilds run in a
+        single thread while the others keep answering from the old index.
+        """
+        if not self.is_stale():
+            return
+        if not self._load_lock.acquire(blocking=self.loaded_at is None):
+            return
+        try:
+            if self.is_stale():
+                with connect() as conn, conn.cursor() as cur:
+                    self.load(cur)
+        finally:
+            self._load_lock.release()
+
+    def load(self, cur):
+        docs = self._fetch(cur, "", ())
+        postings = {}
+        for doc in docs.values():
+            for gram in doc['grams']:
+                postings.setdefault(gram, set()).add(doc['event_id'])
+        with self._lock:
+            self._docs, self._postings = docs, postings
+            self.loaded_at = time.monotonic()
+
+    def refresh_event(self, cur, event_id):
+        event_id = int(event_id)
+        self._replace(self._fetch(cur, "AND e.event_id = %s", (event_id,)), [event_id])
+
+    def refresh_venue(self, cur, venue_id):
+        venue_id = int(venue_id)
+        with self._lock:
+            old_ids = [i for i, doc in self._docs.items() if doc['venue_id'] == venue_id]
+        self._replace(self._fetch(cur, "AND e.venue_id = %s", (venue_id,)), old_ids)
+
+    def search(self, query, limit=10):
+        """Upcoming events matching `query`, soonest first."""
+        query = query.lower()
+        n = 3 if len(query) >= 3 else 2
+        grams = _grams(query, n)
+        now = datetime.now()
+        with self._lock:
+            postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+            if not postings or not postings[0]:
+                return []
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                candidates &= ids
+                if not candidates:
+                    return []
+            hits = [self._docs[i] for i in candidates]
+        hits = [doc for doc in hits
+                if doc['start_time'] > now and any(query in field for field in doc['fields'])]
+        hits.sort(key=lambda doc: doc['start_time'])
+        return hits[:limit]
+
+    def _fetch(self, cur, where, params):
+        cur.execute(_EVENTS_SQL.format(where=where), params or None)
+        docs = {}
+        for event_id, venue_id, title, start_time, venue, city, genre in cur.fetchall():
+            docs[event_id] = {
+                'event_id': event_id, 'venue_id': venue_id, 'title': title,
+                'start_time': start_time, 'venue': venue, 'city': city, 'genre': genre,
+                'performers': [],
+            }
+        cur.execute(_PERFORMERS_SQL.format(where=where), params or None)
+        for event_id, stage_name in cur.fetchall():
+            if event_id in docs:
+                docs[event_id]['performers'].append(stage_name)
+        for doc in docs.values():
+            fields = [doc['title'], doc['venue'], doc['city'], doc['genre']] + doc['performers']
+            doc['fields'] = [f.lower() for f in fields if f]
+            doc['grams'] = set()
+            for field in doc['fields']:
+                doc['grams'] |= _grams(field, 2) | _grams(field, 3)
+        return docs
+
+    def _replace(self, docs, old_ids):
+        with self._lock:
+            for event_id in set(old_ids) | set(docs):
+                old = self._docs.pop(event_id, None)
+                if old is not None:
+                    for gram in old['grams']:
+                        ids = self._postings.get(gram)
+                        if ids is not None:
+                            ids.discard(event_id)
+                            if not ids:
+                                del self._postings[gram]
+            for event_id, doc in docs.items():
+                self._docs[event_id] = doc
+                for gram in doc['grams']:
+                    self._postings.setdefault(gram, set()).add(event_id)
@@ -0,0 +1,259 @@
+import base64
+import re
+import threading
+import time
+from array import array
+from itertools import accumulate
+from operator import sub
+
+GENERAL_SECTION = 'General Admission'
+
+_BUILD_SQL = """
+    SELECT
+        t.ticket_id,
+        t.face_value,
+        t.ticket_status,
+        pi.ticket_id IS NULL AS unsold,
+        s.seat_section,
+        s.row_label,
+        s.seat_number,
+        CASE WHEN vt.ticket_id IS NOT NULL THEN 'VIP' ELSE 'Regular' END as ticket_type,
+        vt.vip_level,
+        vt.perks,
+        s.quality
+    FROM tickets t
+    LEFT JOIN seats s ON t.seat_id = s.seat_id
+    LEFT JOIN vip_tickets vt ON t.ticket_id = vt.ticket_id
+    LEFT JOIN purchase_items pi ON pi.ticket_id = t.ticket_id
+    WHERE t.event_id = %s
+"""
+
+_DIGITS = re.compile(r'(\d+)')
+
+
+def _natural(value):
+    """Sort key that puts seat '2' before seat '10'."""
+    return [int(part) if part.isdigit() else part for part in _DIGITS.split(value or '')]
+
+
+def _adjacent(left, right):
+    """Whether two seats that follow each other in a row are physically next to each other."""
+    if left and right and left.isdigit() and right.isdigit():
+        return int(right) - int(left) == 1
+    return True
+
+
+class SeatMap:
+    """Availability of one event's tickets, stored as flat arrays in seat order.
+
+    Seats are ordered by section, row and seat number, so every row is a
+    contiguous slice [start, end) of the arrays. `available` holds one byte
+    per ticket and `tier` points into `tiers`, the distinct
+    (price, type, vip level, perks) combinations of the event.
+
+    `blocks` splits the rows further at gaps in the seat numbering, so the
+    seats of a block are physically next to each other, and `quality`
+    scores every seat for best-available allocation: seats.quality where
+    the venue has set it, otherwise derived from the position (front rows,
+    then the middle of a row, score highest).
+    """
+
+    def __init__(self, event_id, rows):
+        self.event_id = event_id
+        self.built_at = time.monotonic()
+        rows = sorted(rows, key=lambda r: (r['section'] is None, _natural(r['section']),
+                                           _natural(r['row']), _natural(r['seat'])))
+        self.ticket_ids = array('l', (r['ticket_id'] for r in rows))
+        self.seat_numbers = [r['seat'] for r in rows]
+        self.available = bytearray(1 if r['available'] else 0 for r in rows)
+        self.position = {ticket_id: i for i, ticket_id in enumerate(self.ticket_ids)}
+        self.tiers = []
+        tier_index = {}
+        self.tier = array('H')
+        for r in rows:
+            key = (r['price'], r['type'], r['vip_level'], r['perks'])
+            if key not in tier_index:
+                tier_index[key] = len(self.tiers)
+                self.tiers.append(key)
+            self.tier.append(tier_index[key])
+        # (section, row_label, start, end) for every row
+        self.rows = []
+        for i, r in enumerate(rows):
+            section = r['section'] or GENERAL_SECTION
+            if self.rows and self.rows[-1][:2] == [section, r['row']]:
+                self.rows[-1][3] = i + 1
+            else:
+                self.rows.append([section, r['row'], i, i + 1])
+        # (row index, start, end) for every run of physically adjacent seats
+        self.blocks = []
+        self.quality = array('f', bytes(4 * len(rows)))
+        row_rank = 0
+        for index, (section, _, start, end) in enumerate(self.rows):
+            row_rank = row_rank + 1 if index and self.rows[index - 1][0] == section else 0
+            block_start = start
+            for i in range(start, end):
+                if i > start and not _adjacent(rows[i - 1]['seat'], rows[i]['seat']):
+                    self.blocks.append((index, block_start, i))
+                    block_start = i
+                quality = rows[i].get('quality')
+                if quality is None:
+                    quality = 100 - 2 * row_rank - 0.5 * abs(i - (start + end - 1) / 2)
+                self.quality[i] = quality
+            self.blocks.append((index, block_start, end))
+        self._tier_masks = {}  # (max_price, ticket_type) -> byte mask of allowed seats
+        # Blocks by their best seat, so the search can stop once no block can win
+        self.block_peaks = [max(self.quality[start:end]) for _, start, end in self.blocks]
+        self.block_order = sorted(range(len(self.blocks)), key=self.block_peaks.__getitem__, reverse=True)
+
+    @classmethod
+    def load(cls, cur, event_id):
+        cur.execute(_BUILD_SQL, (event_id,))
+        rows = [{
+            'ticket_id': ticket_id, 'price': price,
+            'available': status == 'available' and unsold,
+            'section': section, 'row': row_label, 'seat': seat_number,
+            'type': ticket_type, 'vip_level': vip_level, 'perks': perks,
+            'quality': quality,
+        } for (ticket_id, price, status, unsold, section, row_label, seat_number,
+               ticket_type, vip_level, perks, quality) in cur.fetchall()]
+        return cls(event_id, rows)
+
+    def set_available(self, ticket_ids, available):
+        flag = 1 if available else 0
+        for ticket_id in ticket_ids:
+            i = self.position.get(int(ticket_id))
+            if i is not None:
+                self.available[i] = flag
+
+    def available_count(self):
+        return self.available.count(1)
+
+    def best_block(self, quantity, section=None, max_price=None, ticket_type=None):
+        """Ticket ids of the best `quantity` adjacent available seats, or None.
+
+        Only seats in the same row and block qualify; the block with the
+        highest total quality wins. Unavailable seats are skipped with
+        bytearray.find, and blocks are visited best seat first, so the
+        search usually stops after a few rows even in a 60k-seat venue.
+        """
+        usable = self.available
+        if max_price is not None or ticket_type:
+            key = (max_price, ticket_type)
+            mask = self._tier_masks.get(key)
+            if mask is None:
+                allowed = bytes(1 if (max_price is None or price <= max_price)
+                                and (not ticket_type or kind == ticket_type) else 0
+                                for price, kind, _, _ in self.tiers)
+                mask = self._tier_masks[key] = bytes(map(allowed.__getitem__, self.tier))
+            # AND of the two byte masks as big integers, at C speed
+            usable = (int.from_bytes(usable, 'big') & int.from_bytes(mask, 'big')).to_bytes(len(usable), 'big')
+        pattern = b'\x01' * quantity
+        best_score, best_start = None, None
+        for b in self.block_order:
+            if best_score is not None and quantity * self.block_peaks[b] <= best_score:
+                break
+            row_index, start, end = self.blocks[b]
+            if end - start < quantity or (section and self.rows[row_index][0] != section):
+                continue
+            i = usable.find(pattern, start, end)
+            while i != -1:
+                run_end = usable.find(b'\x00', i, end)
+                if run_end == -1:
+                    run_end = end
+                # Best window inside the free run [i, run_end) by prefix sums
+                prefix = list(accumulate(self.quality[i:run_end], initial=0.0))
+                sums = list(map(sub, prefix[quantity:], prefix))
+                score = max(sums)
+                if best_score is None or score > best_score:
+                    best_score, best_start = score, i + sums.index(score)
+                i = usable.find(pattern, run_end, end)
+        if best_start is None:
+            return None
+        return self.ticket_ids[best_start:best_start + quantity].tolist()
+
+    def to_json(self):
+        """Compact representation for the seat-map endpoint.
+
+        Per row: seat numbers, ticket ids delta-encoded (first id, then
+        differences), tier indexes and availability as base64 bits, most
+        significant bit first.
+        """
+        sections = []
+        for section, row_label, start, end in self.rows:
+            if not sections or sections[-1]['name'] != section:
+                sections.append({'name': section, 'rows': []})
+            ids = self.ticket_ids[start:end]
+            sections[-1]['rows'].append({
+                'row': row_label,
+                'seats': self.seat_numbers[start:end],
+                'tickets': [ids[0]] + [ids[i] - ids[i - 1] for i in range(1, len(ids))],
+                'tiers': self.tier[start:end].tolist(),
+                'avail': _pack_bits(self.available[start:end]),
+            })
+        return {
+            'event_id': self.event_id,
+            'available': self.available_count(),
+            'tiers': [{'price': f"{price:.2f}", 'type': ticket_type, 'vip_level': vip_level, 'perks': perks}
+                      for price, ticket_type, vip_level, perks in self.tiers],
+            'sections': sections,
+        }
+
+
+def _pack_bits(flags):
+    packed = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            packed[i >> 3] |= 0x80 >> (i & 7)
+    return base64.b64encode(bytes(packed)).decode('ascii')
+
+
+class SeatMapRegistry:
+    """Process-wide seat maps, built on demand and kept for `max_age` seconds.
+
+    Sales made by this process update the maps in place; the rebuild after
+    `max_age` picks up changes made by other workers.
+    """
+
+    def __init__(self, max_age=30, maxsize=64):
+        self.max_age = max_age
+        self.maxsize = maxsize
+        self._maps = {}
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    def get(self, connect, event_id):
+        seat_map = self._fresh(event_id)
+        if seat_map is not None:
+            return seat_map
+        with self._lock:
+            build_lock = self._build_locks.setdefault(event_id, threading.Lock())
+        # One build per event; concurrent viewers wait for it instead of piling on
+        with build_lock:
+            seat_map = self._fresh(event_id)
+            if seat_map is None:
+                with connect() as conn, conn.cursor() as cur:
+                    seat_map = SeatMap.load(cur, event_id)
+                with self._lock:
+                    self._maps[event_id] = seat_map
+                    while len(self._maps) > self.maxsize:
+                        oldest = min(self._maps, key=lambda i: self._maps[i].built_at)
+                        del self._maps[oldest]
+        return seat_map
+
+    def _fresh(self, event_id):
+        seat_map = self._maps.get(event_id)
+        if seat_map is not None and time.monotonic() - seat_map.built_at < self.max_age:
+            return seat_map
+        return None
+
+    def set_available(self, event_id, ticket_ids, available):
+        seat_map = self._maps.get(int(event_id))
+        if seat_map is not None:
+            seat_map.set_available(ticket_ids, available)
+
+    def invalidate(self, event_id=None):
+        with self._lock:
+            if event_id is None:
+                self._maps.clear()
+            else:
+                self._maps.pop(int(event_id), None)
@@ -0,0 +1,101 @@
+// Async pickers for the admin forms.
+//
+// A <select data-lookup="URL"> gets a search box and is filled page by page
+// from the lookup endpoint as the admin types. Optional attributes:
+//   data-lookup-parent="event_id"  only options for the value of that field
+//                                  in the same form (reloaded when it changes)
+//   data-lookup-flag="unsold"      extra filter passed to the endpoint
+(function () {
+    function enhance(select) {
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.placeholder = 'Type to search...';
+        search.className = 'lookup-search';
+        const more = document.createElement('button');
+        more.type = 'button';
+        more.className = 'lookup-more';
+        more.textContent = 'Load more';
+        more.hidden = true;
+        select.before(search);
+        select.after(more);
+
+        const placeholder = select.querySelector('option[value=""]');
+        const parentName = select.dataset.lookupParent;
+        const parent = parentName ? select.form.elements[parentName] : null;
+        let next = null;
+        let latest = 0;
+        let loadedFor = null;
+        let timer;
+
+        function load(append) {
+            const params = new URLSearchParams({q: search.value.trim()});
+            if (select.dataset.lookupFlag) {
+                params.set('flag', select.dataset.lookupFlag);
+            }
+            if (parent) {
+                loadedFor = parent.value;
+                if (!parent.value) {
+                    fill([], false, null);
+                    return;
+                }
+                params.set(parentName, parent.value);
+            }
+            if (append && next) {
+                params.set('after', next);
+            }
+            const request = ++latest;
+            fetch(`${select.dataset.lookup}?${params}`)
+                .then(response => response.json())
+                .then(page => {
+                    // Answers to superseded queries are dropped
+                    if (request === latest) {
+                        fill(page.items, append, page.next);
+                    }
+                })
+                .catch(err => console.error('Lookup error:', err));
+        }
+
+        function fill(items, append, nextCursor) {
+            if (!append) {
+                Array.from(select.options).forEach(option => {
+                    if (option !== placeholder) {
+                        option.remove();
+                    }
+                });
+            }
+            items.forEach(item => select.add(new Option(item.label, item.id)));
+            next = nextCursor;
+            more.hidden = !next;
+            // Dependent pickers reload without a change event, which would
+            // submit the edit pickers' forms
+            select.dispatchEvent(new Event('lookup:loaded'));
+        }
+
+        search.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => load(false), 250);
+        });
+        search.addEventListener('keydown', e => {
+            // Enter searches instead of submitting the admin form
+            if (e.key === 'Enter') {
+                e.preventDefault();
+                clearTimeout(timer);
+                load(false);
+            }
+        });
+        more.addEventListener('click', () => load(true));
+        if (parent) {
+            parent.addEventListener('change', () => load(false));
+            parent.addEventListener('lookup:loaded', () => {
+                if (parent.value !== loadedFor) {
+                    load(false);
+                }
+            });
+        }
+        load(false);
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('select[data-lookup]').forEach(enhance);
+    });
+})();
@@ -0,0 +1,283 @@
+"""
+Atomic ticket claiming for checkout.
+
+Tickets are locked with SELECT ... FOR UPDATE before anything is written,
+always in ticket_id order so two baskets sharing seats queue behind each
+other instead of deadlocking. A basket with any ticket that is no longer
+available fails as a whole with TicketsUnavailable; nothing is sold twice.
+
+Selecting tickets puts them on hold: they move to 'reserved' with a
+hold_expires_at and the buyer's person_id in held_by, so nobody else can
+claim them between selection and payment. HoldSweeper returns expired
+holds to 'available' in bulk.
+"""
+
+import random
+import secrets
+import threading
+import time
+
+import pymysql
+
+import event_summary
+
+# ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+RETRYABLE_ERRORS = (1213, 1205)
+
+
+class TicketsUnavailable(Exception):
+    """Some of the requested tickets were sold, held or removed meanwhile."""
+
+    def __init__(self, ticket_ids):
+        super().__init__(f"Tickets no longer available: {ticket_ids}")
+        self.ticket_ids = ticket_ids
+
+
+def claim_tickets(cur, ticket_ids, held_by=None, event_id=None):
+    """Lock the given tickets and return their (ticket_id, face_value, event_id, ticket_status) rows.
+
+    Once the locks are held, raises TicketsUnavailable if any of them is
+    missing, belongs to another event than `event_id` (when given) or is
+    neither 'available' nor on hold for `held_by`. A buyer's own hold stays
+    claimable after it expires until the sweeper releases it.
+    """
+    ticket_ids = sorted({int(ticket_id) for ticket_id in ticket_ids})
+    placeholders = ','.join(['%s'] * len(ticket_ids))
+    cur.execute(f"""
+        SELECT ticket_id, face_value, event_id, ticket_status, held_by
+        FROM tickets
+        WHERE ticket_id IN ({placeholders}) {'AND event_id = %s' if event_id is not None else ''}
+        ORDER BY ticket_id
+        FOR UPDATE
+    """, ticket_ids + ([event_id] if event_id is not None else []))
+    tickets = [row[:4] for row in cur.fetchall()
+               if row[3] == 'available' or (held_by is not None and row[3] == 'reserved' and row[4] == held_by)]
+    claimed = {ticket[0] for ticket in tickets}
+    missing = [ticket_id for ticket_id in ticket_ids if ticket_id not in claimed]
+    if missing:
+        raise TicketsUnavailable(missing)
+    return tickets
+
+
+def claim_best_block(cur, seat_maps, connect, event_id, quantity, attempts=3, **criteria):
+    """Lock the best `quantity` adjacent seats of an event, picked from its seat map.
+
+    `seat_maps` is a seatmap.SeatMapRegistry and `criteria` go to
+    SeatMap.best_block. The map may be stale: the locking claim re-checks
+    the picked tickets, and ones found taken are marked in the map before
+    the next pick.
+    """
+    for _ in range(attempts):
+        block = seat_maps.get(connect, event_id).best_block(quantity, **criteria)
+        if block is None:
+            break
+        try:
+            return claim_tickets(cur, block, event_id=event_id)
+        except TicketsUnavailable as e:
+            seat_maps.set_available(event_id, e.ticket_ids, False)
+    raise TicketsUnavailable([])
+
+
+def register_request(cur, key, person_id):
+    """Record an idempotency key as the first statement of a checkout transaction.
+
+    Returns None when the key is new. A concurrent request with the same key
+    blocks on the key's row until this transaction ends; if it committed,
+    the replay gets the recorded purchase_id instead of buying again.
+    """
+    # IGNORE turns the duplicate key into "0 rows", so the replay needs no error handling
+    cur.execute("""
+        INSERT IGNORE INTO purchase_requests (idempotency_key, person_id)
+        VALUES (%s, %s)
+    """, (key, person_id))
+    if cur.rowcount:
+        return None
+    purchase_id = completed_request(cur, key, person_id)
+    if purchase_id is None:
+        raise ValueError("Idempotency key was used by another buyer")
+    return purchase_id
+
+
+def completed_request(cur, key, person_id):
+    """purchase_id recorded for a buyer's idempotency key, or None.
+
+    A locking read, so a checkout still running under the key is waited
+    for instead of read from a snapshot taken before it committed.
+    """
+    cur.execute("""
+        SELECT purchase_id FROM purchase_requests
+        WHERE idempotency_key = %s AND person_id = %s
+        FOR SHARE
+    """, (key, person_id))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def finish_request(cur, key, purchase_id):
+    cur.execute("UPDATE purchase_requests SET purchase_id = %s WHERE idempotency_key = %s",
+                (purchase_id, key))
+
+
+def record_purchase(cur, customer_id, tickets, payment_method='card'):
+    """Sell claimed tickets: purchase, items, status flip, summary and payment.
+
+    A fixed number of statements whatever the basket size. Returns the
+    new purchase_id; the caller commits.
+    """
+    total = sum(ticket[1] for ticket in tickets)
+    cur.execute("""
+        INSERT INTO purchases (customer_id, total_amount, purch_status)
+        VALUES (%s, %s, 'completed')
+    """, (customer_id, total))
+    purchase_id = cur.lastrowid
+
+    # executemany sends a single multi-row INSERT
+    cur.executemany("""
+        INSERT INTO purchase_items (purchase_id, ticket_id, price_paid)
+        VALUES (%s, %s, %s)
+    """, [(purchase_id, ticket[0], ticket[1]) for ticket in tickets])
+
+    ticket_ids = [ticket[0] for ticket in tickets]
+    cur.execute(f"""
+        UPDATE tickets SET ticket_status = 'sold', hold_expires_at = NULL, held_by = NULL
+        WHERE ticket_id IN ({','.join(['%s'] * len(ticket_ids))})
+    """, ticket_ids)
+
+    # One summary update per event and previous status, not per ticket
+    status_changes = {}
+    for _, _, event_id, old_status in tickets:
+        key = (event_id, old_status)
+        status_changes[key] = status_changes.get(key, 0) + 1
+    for (event_id, old_status), count in status_changes.items():
+        event_summary.tickets_changed(cur, event_id, old_status, 'sold', count)
+
+    transaction_ref = f"TX-{purchase_id}-{secrets.token_hex(4).upper()}"
+    cur.execute("""
+        INSERT INTO payments (purchase_id, amount, method, transaction_ref, payment_status)
+        VALUES (%s, %s, %s, %s, 'ok')
+    """, (purchase_id, total, payment_method, transaction_ref))
+    return purchase_id
+
+
+def _count_by_event(tickets):
+    counts = {}
+    for ticket in tickets:
+        counts[ticket[2]] = counts.get(ticket[2], 0) + 1
+    return counts
+
+
+def hold_tickets(cur, tickets, held_by, ttl):
+    """Put claimed tickets on hold for `ttl` seconds; the caller commits."""
+    ticket_ids = [ticket[0] for ticket in tickets]
+    cur.execute(f"""
+        UPDATE tickets
+        SET ticket_status = 'reserved', held_by = %s,
+            hold_expires_at = NOW() + INTERVAL %s SECOND
+        WHERE ticket_id IN ({','.join(['%s'] * len(ticket_ids))})
+    """, [held_by, int(ttl)] + ticket_ids)
+    for event_id, count in _count_by_event([t for t in tickets if t[3] != 'reserved']).items():
+        event_summary.tickets_changed(cur, event_id, 'available', 'reserved', count)
+
+
+def release_holds(cur, held_by, ticket_ids):
+    """Give up a buyer's holds on the given tickets, e.g. when the cart is replaced.
+
+    Returns the released (ticket_id, event_id) pairs.
+    """
+    ticket_ids = [int(ticket_id) for ticket_id in ticket_ids]
+    if not ticket_ids:
+        return []
+    cur.execute(f"""
+        SELECT ticket_id, face_value, event_id, ticket_status
+        FROM tickets
+        WHERE ticket_id IN ({','.join(['%s'] * len(ticket_ids))})
+            AND ticket_status = 'reserved' AND held_by = %s
+        ORDER BY ticket_id
+        FOR UPDATE
+    """, ticket_ids + [held_by])
+    return _release(cur, cur.fetchall())
+
+
+def release_expired_holds(cur, limit=1000):
+    """Return up to `limit` expired holds to 'available'.
+
+    SKIP LOCKED lets the sweepers of several workers run side by side, and
+    leaves alone holds whose buyer is checking out right now.
+    Returns the released (ticket_id, event_id) pairs.
+    """
+    cur.execute("""
+        SELECT ticket_id, face_value, event_id, ticket_status
+        FROM tickets
+        WHERE ticket_status = 'reserved' AND hold_expires_at < NOW()
+        ORDER BY hold_expires_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (limit,))
+    return _release(cur, cur.fetchall())
+
+
+def _release(cur, tickets):
+    if not tickets:
+        return []
+    ticket_ids = [ticket[0] for ticket in tickets]
+    cur.execute(f"""
+        UPDATE tickets SET ticket_status = 'available', hold_expires_at = NULL, held_by = NULL
+        WHERE ticket_id IN ({','.join(['%s'] * len(ticket_ids))})
+    """, ticket_ids)
+    for event_id, count in _count_by_event(tickets).items():
+        event_summary.tickets_changed(cur, event_id, 'reserved', 'available', count)
+    return [(ticket[0], ticket[2]) for ticket in tickets]
+
+
+class HoldSweeper(threading.Thread):
+    """Daemon thread that releases expired holds every `interval` seconds.
+
+    `on_release` is called with the released (ticket_id, event_id) pairs
+    after each committed batch.
+    """
+
+    def __init__(self, connect, interval=15, batch=1000, on_release=None):
+        super().__init__(name='hold-sweeper', daemon=True)
+        self.connect = connect
+        self.interval = interval
+        self.batch = batch
+        self.on_release = on_release
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Hold sweeper error: {e}")
+
+    def sweep(self):
+        released = []
+        while True:
+            with self.connect() as conn, conn.cursor() as cur:
+                batch = release_expired_holds(cur, self.batch)
+                conn.commit()
+            if batch and self.on_release:
+                self.on_release(batch)
+            released += batch
+            if len(batch) < self.batch:
+                return released
+
+    def stop(self):
+        self._stopped.set()
+
+
+def with_retry(work, attempts=4, base_delay=0.02):
+    """Call `work()` again after a deadlock or lock-wait timeout.
+
+    `work` must run its whole transaction, so a retry starts from a rolled
+    back state. Waits grow exponentially with jitter so the transactions
+    that collided do not collide again.
+    """
+    for attempt in range(attempts):
+        try:
+            return work()
+        except pymysql.err.OperationalError as e:
+            if e.args[0] not in RETRYABLE_ERRORS or attempt == attempts - 1:
+                raise
+            time.sleep(base_delay * (2 ** attempt) * random.uniform(0.5, 1.5))
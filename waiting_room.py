@@ -0,0 +1,142 @@
+"""
+Virtual waiting room in front of the purchase flow.
+
+Every event has its own line. Shoppers are admitted at `rate` per second,
+with up to `burst` admitted at once after a quiet spell, so an on-sale
+spike turns into a steady stream of checkouts instead of a wall of
+connections. While the line is empty, entering is immediate and nobody
+ever sees the waiting page.
+
+Admission is a pass in the signed session cookie, so any worker accepts
+it. The lines themselves are in process memory: the rate applies per
+worker, and queued clients must keep polling the worker that queued them
+(sticky sessions). Polling reads only this memory and the session, never
+the database, and never joins the line; only event_queue does. Shoppers
+whose turn came but who stopped polling lose it after `claim_ttl` seconds.
+"""
+
+import secrets
+import threading
+import time
+from collections import deque
+
+from flask import session
+
+
+class _Line:
+    def __init__(self, burst, now):
+        self.issued = 0  # queue numbers handed out
+        self.admitted = 0  # queue numbers below this are in
+        self.budget = float(burst)
+        self.updated = now
+        self.tokens = {}  # token -> queue number, in queue order
+        self.claims = deque()  # (admitted, deadline): numbers below admitted expire at deadline
+
+
+class WaitingRoom:
+    def __init__(self, rate=10, burst=50, pass_ttl=900, idle_ttl=3600, claim_ttl=60):
+        self.rate = rate
+        self.burst = burst
+        self.pass_ttl = pass_ttl
+        self.claim_ttl = claim_ttl
+        self.idle_ttl = idle_ttl
+        self._lines = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _advance(self, event_id):
+        """Admit as many waiting shoppers as the time since the last call allows."""
+        now = time.monotonic()
+        line = self._lines.get(event_id)
+        if line is None:
+            line = self._lines[event_id] = _Line(self.burst, now)
+        line.budget = min(self.burst, line.budget + (now - line.updated) * self.rate)
+        line.updated = now
+        admit = min(int(line.budget), line.issued - line.admitted)
+        line.admitted += admit
+        line.budget -= admit
+        if admit:
+            line.claims.append((line.admitted, now + self.claim_ttl))
+        # Drop admitted tokens nobody came back for
+        while line.claims and line.claims[0][1] < now:
+            limit = line.claims.popleft()[0]
+            while line.tokens:
+                token = next(iter(line.tokens))
+                if line.tokens[token] >= limit:
+                    break
+                del line.tokens[token]
+        return line
+
+    def enter(self, event_id):
+        """True if the shopper has a pass or can go straight in because nobody is waiting."""
+        if not self.enabled or self.has_pass(event_id):
+            return True
+        with self._lock:
+            line = self._advance(event_id)
+            if line.issued > line.admitted or line.budget < 1:
+                return False
+            line.issued += 1
+            line.admitted += 1
+            line.budget -= 1
+        self._grant(event_id)
+        return True
+
+    def join(self, event_id):
+        """Put the shopper at the back of the line unless they are already in it."""
+        queued = session.get('queue', {})
+        with self._lock:
+            line = self._advance(event_id)
+            if queued.get(str(event_id)) in line.tokens:
+                return
+            token = secrets.token_urlsafe(12)
+            line.tokens[token] = line.issued
+            line.issued += 1
+            self._expire_idle()
+        session['queue'] = {**queued, str(event_id): token}
+
+    def status(self, event_id):
+        """Position of the shopper in the line, granting the pass once their turn has come.
+
+        Returns None when the shopper is not queued for this event (or the
+        line was dropped after a restart), so the client can join again.
+        """
+        if self.has_pass(event_id):
+            return {'admitted': True}
+        token = session.get('queue', {}).get(str(event_id))
+        with self._lock:
+            line = self._advance(event_id)
+            number = line.tokens.get(token)
+            if number is None:
+                return None
+            ahead = number - line.admitted
+            if ahead < 0:
+                del line.tokens[token]
+        if ahead < 0:
+            queued = dict(session.get('queue', {}))
+            queued.pop(str(event_id), None)
+            session['queue'] = queued
+            self._grant(event_id)
+            return {'admitted': True}
+        return {'admitted': False, 'ahead': ahead, 'wait_seconds': int(ahead / self.rate) + 1}
+
+    def has_pass(self, event_id):
+        return session.get('admission', {}).get(str(event_id), 0) > time.time()
+
+    def _grant(self, event_id):
+        now = time.time()
+        passes = {k: v for k, v in session.get('admission', {}).items() if v > now}
+        passes[str(event_id)] = now + self.pass_ttl
+        session['admission'] = passes
+
+    def _expire_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        for event_id in [e for e, line in self._lines.items() if line.updated < cutoff]:
+            del self._lines[event_id]
+
+    def stats(self):
+        with self._lock:
+            return {str(event_id): {'waiting': line.issued - line.admitted, 'admitted': line.admitted}
+                    for event_id, line in self._lines.items()}